@@ -7,6 +7,7 @@ import imgui
 from imgui.integrations.glfw import GlfwRenderer
 from tostudents.shape2d.shape2d import *
 from tostudents.main.axes import Axes
+from tostudents.libs import gl_state
 
 
 class UIState:
@@ -89,8 +90,8 @@ class Viewer:
         glfw.set_cursor_pos_callback(self.win, self.on_mouse_move)
         glfw.set_scroll_callback(self.win, self.on_scroll)
 
-        GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glDisable(GL.GL_CULL_FACE)
+        gl_state.enable(GL.GL_DEPTH_TEST)
+        gl_state.disable(GL.GL_CULL_FACE)
         GL.glClearColor(0.0, 0.0, 0.0, 1.0)
 
     def make_colors(self):
@@ -278,6 +279,7 @@ class Viewer:
             glfw.poll_events()
             self.impl.process_inputs()
             imgui.new_frame()
+            gl_state.begin_frame()
 
             self.render_ui(self.state)
             self._update_scene_from_state()
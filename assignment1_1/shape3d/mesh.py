@@ -5,7 +5,9 @@ from OpenGL import GL
 from tostudents.libs.shader import *
 from tostudents.libs import transform as T
 from tostudents.libs.buffer import *
-class EquationSurface(object):
+from tostudents.libs import gl_state
+from tostudents.libs.bounds import Bounded
+class EquationSurface(Bounded):
     def __init__(self, vert_shader, frag_shader, func_str="sin(x)*cos(y)",
              x_range=(-5,5), y_range=(-5,5), n=80):
         self.x_range = x_range
@@ -48,7 +50,7 @@ class EquationSurface(object):
                 self.normals[j * n + i] = nrm / (np.linalg.norm(nrm) + 1e-8)
 
         # --- 6. Shader + VAO + Uniform manager
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.vao = VAO()
         self.transform = np.eye(4)
@@ -63,17 +65,16 @@ class EquationSurface(object):
 
     def draw(self, projection, view, model):
         """Vẽ bề mặt"""
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, "projection", True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, "model", True)
-        self.uma.upload_uniform_matrix4fv(view, "view", True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
     def set_color(self, rgb):
@@ -1,15 +1,3 @@
 #version 330 core
-layout(location = 0) in vec3 a_position;
-layout(location = 1) in vec3 a_color;
-
-out vec3 v_color;
-
-uniform mat4 projection;
-uniform mat4 model;
-uniform mat4 view;
-
-void main() {
-    mat4 modelview = view * model;
-    gl_Position = projection * modelview * vec4(a_position, 1.0);
-    v_color = a_color;
-}
+#define VERTEX_COLOR
+#include "uber.vert"
@@ -1,17 +1,3 @@
 #version 330 core
-
-layout(location = 0) in vec3 a_position;
-layout(location = 1) in vec3 a_color;
-
-uniform mat4 projection;
-uniform mat4 model;
-uniform mat4 view;
-
-out vec3 v_color;
-
-void main() {
-    // chỉ nội suy màu gốc giữa các đỉnh
-    v_color = a_color;
-    mat4 modelview = view * model;
-    gl_Position = projection * modelview * vec4(a_position, 1.0);
-}
+#define VERTEX_COLOR
+#include "uber.vert"
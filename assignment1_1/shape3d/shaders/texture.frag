@@ -1,7 +1,3 @@
 #version 330 core
-in vec2 TexCoord;
-out vec4 FragColor;
-uniform sampler2D tex;
-void main() {
-    FragColor = texture(tex, TexCoord);
-}
+#define TEXTURE
+#include "uber.frag"
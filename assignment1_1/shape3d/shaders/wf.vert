@@ -1,10 +1,2 @@
 #version 330 core
-layout(location = 0) in vec3 a_position;
-uniform mat4 projection;
-uniform mat4 model;
-uniform mat4 view;
-
-void main() {
-    mat4 modelview = view * model;
-    gl_Position = projection * modelview * vec4(a_position, 1.0);
-}
+#include "uber.vert"
@@ -2,7 +2,7 @@ import OpenGL.GL as GL
 import glfw
 import numpy as np
 from itertools import cycle
-from tostudents.libs.transform import Trackball, translate, rotate, scale
+from tostudents.libs.transform import Trackball, translate, rotate, scale, ModelMatrix
 import imgui
 from imgui.integrations.glfw import GlfwRenderer
 import numexpr as ne
@@ -13,6 +13,24 @@ from tostudents.shape2d.shape2d import *
 from tostudents.shape3d.basic3d import *
 from tostudents.main.axes import Axes
 from tostudents.assignment1_1.shape3d.mesh import EquationSurface
+from tostudents.libs import gl_state
+from tostudents.libs import texture
+from tostudents.libs.buffer import CameraBlock
+
+SHADER_DIR = "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/assignment1_1/shape3d/shaders/"
+RENDER_MODE_SHADERS = {
+    "Flat": ("flat.vert", "flat.frag"),
+    "Texture": ("texture.vert", "texture.frag"),
+    "Gouraud": ("gouraud.vert", "gouraud.frag"),
+    "Phong": ("phong.vert", "phong.frag"),
+    "Wireframe": ("wf.vert", "wf.frag"),
+}
+
+SHAPES_2D = [
+    "Triangle2D", "Rectangle2D", "Pentagon2D", "Hexagon2D",
+    "Circle2D", "Ellipse2D", "Trapezoid2D", "Star2D", "Arrow2D"
+]
+
 class FunctionUI:
     def __init__(self):
         self.functions = [
@@ -120,6 +138,11 @@ class Viewer:
         # --- Initialize ImGui ---
         imgui.create_context()
         self.impl = GlfwRenderer(self.win)
+        self.camera = CameraBlock()     # projection/view shared by every program
+
+        # --- Submit every render mode's shaders now, the driver compiles them
+        #     while the axes & UI are built (status is checked on first draw) ---
+        compile_all([(SHADER_DIR + v, SHADER_DIR + f) for v, f in RENDER_MODE_SHADERS.values()])
         self.make_colors()
 
         # --- Trackball setup ---
@@ -135,11 +158,12 @@ class Viewer:
         self._last_torus_params = None
         self._last_prism_params = None
         self._last_equation_str = None
+        self._model = ModelMatrix()     # transform sliders -> model matrix, rebuilt when they move
         self.func_ui = FunctionUI()
         # --- Initialize Axes ---
         self.axes = Axes(
-            "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/assignment1_1/shape3d/shaders/gouraud.vert",
-            "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/assignment1_1/shape3d/shaders/gouraud.frag",
+            SHADER_DIR + "gouraud.vert",
+            SHADER_DIR + "gouraud.frag",
             length=2.0
         ).setup()
 
@@ -148,7 +172,7 @@ class Viewer:
         glfw.set_cursor_pos_callback(self.win, self.on_mouse_move)
         glfw.set_scroll_callback(self.win, self.on_scroll)
 
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDepthFunc(GL.GL_LESS)
         GL.glClearColor(0.0, 0.0, 0.0, 1.0)
 
@@ -165,6 +189,8 @@ class Viewer:
             glfw.poll_events()
             self.impl.process_inputs()
             imgui.new_frame()
+            gl_state.begin_frame()
+            texture.process_uploads()       # images decoded in the background, per-frame budget
 
             # Render UI
             self.render_ui(self.state)
@@ -175,13 +201,14 @@ class Viewer:
             win_size = glfw.get_window_size(self.win)
             view = self.trackball.view_matrix()
             projection = self.trackball.projection_matrix(win_size)
+            self.camera.update(projection, view)
 
             # --- Set polygon mode before drawing 3D shapes ---
             render_mode = self.state.render_modes[self.state.render_mode_idx]
             if render_mode == "Wireframe":
-                GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
+                gl_state.polygon_mode(GL.GL_LINE)
             else:
-                GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+                gl_state.polygon_mode(GL.GL_FILL)
 
             # Draw axes
             if self.state.show_axes:
@@ -192,7 +219,7 @@ class Viewer:
                 drawable.draw(projection, view, drawable.transform)
 
             # --- Reset to FILL before rendering ImGui ---
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+            gl_state.polygon_mode(GL.GL_FILL)
 
             imgui.render()
             self.impl.render(imgui.get_draw_data())
@@ -391,6 +418,10 @@ class Viewer:
                     imgui.same_line()
                     _, self.func_ui.ranges[i][3] = imgui.input_float(f"To##Y{i}", self.func_ui.ranges[i][3])
 
+        imgui.separator()
+        imgui.text(gl_state.report())
+        imgui.text(texture.default_cache().report())
+
         imgui.end()
 
     def _update_scene_from_state(self):
@@ -437,33 +468,13 @@ class Viewer:
         
         # --- Chọn shader theo render mode ---
         render_mode = self.state.render_modes[self.state.render_mode_idx]
-        shader_dir = "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/assignment1_1/shape3d/shaders/"
-
-        #shader_changed = getattr(self, "_last_render_mode", None) != render_mode
-        #self._last_render_mode = render_mode
-        if render_mode == "Phong":
-            vert = shader_dir + "phong.vert"
-            frag = shader_dir + "phong.frag"
-        elif render_mode == "Gouraud":
-            vert = shader_dir + "gouraud.vert"
-            frag = shader_dir + "gouraud.frag"
-        elif render_mode == "Flat":
-            vert = shader_dir + "flat.vert"
-            frag = shader_dir + "flat.frag"
-        elif render_mode == "Texture":
-            vert = shader_dir + "texture.vert"
-            frag = shader_dir + "texture.frag"
-        else:
-            vert = shader_dir + "wf.vert"
-            frag = shader_dir + "wf.frag"
+        vert, frag = RENDER_MODE_SHADERS.get(render_mode, RENDER_MODE_SHADERS["Wireframe"])
+        vert, frag = SHADER_DIR + vert, SHADER_DIR + frag
         shader_changed = getattr(self, "_last_render_mode", None) != render_mode
         self._last_render_mode = render_mode
         if needs_recreate:
             try:
-                if current_shape in [
-                    "Triangle2D", "Rectangle2D", "Pentagon2D", "Hexagon2D",
-                    "Circle2D", "Ellipse2D", "Trapezoid2D", "Star2D", "Arrow2D"
-                ]:
+                if current_shape in SHAPES_2D:
                     shape_class = globals()[current_shape]
                     self._managed_drawable = shape_class(
                         render_mode=self.state.render_modes[self.state.render_mode_idx],
@@ -563,6 +574,17 @@ class Viewer:
             except Exception as e:
                 print(f"Error creating shape: {e}")
                 pass
+
+        elif shader_changed and self._managed_drawable is not None and current_shape not in SHAPES_2D:
+            # --- Đổi render mode: dùng lại shader variant đã compile, không tạo lại shape ---
+            self._managed_drawable.shader = shader_variant(vert, frag)
+            self._managed_drawable.uma = UManager(self._managed_drawable.shader)
+            if (render_mode == "Texture" and hasattr(self._managed_drawable, "load_texture")
+                    and self._managed_drawable.texture_id is None):
+                try:
+                    self._managed_drawable.load_texture(self.state.texture_path)
+                except Exception as e:
+                    print(f"Error loading texture: {e}")
         
         # --- LUÔN update transform và color (mỗi frame) ---
         if self._managed_drawable:
@@ -570,15 +592,10 @@ class Viewer:
            
             # Tính transform matrix
             # Thứ tự: Scale → Rotate → Translate
-            # (trong code, đọc từ phải sang trái do matrix multiplication)
-            transform = (
-                translate(s.translate)
-                @ rotate(axis=[1, 0, 0], angle=s.rotate[0])
-                @ rotate(axis=[0, 1, 0], angle=s.rotate[1])
-                @ rotate(axis=[0, 0, 1], angle=s.rotate[2])
-                @ scale(s.scale)
-            )
-            
+            # translate @ rotate_x @ rotate_y @ rotate_z @ scale, closed form,
+            # reused while the sliders do not move
+            transform = self._model.update(s.translate, s.rotate, s.scale)
+
             self._managed_drawable.transform = transform
             
             # --- Apply flat color if in Flat mode ---
@@ -595,7 +612,7 @@ class Viewer:
             if key == glfw.KEY_ESCAPE or key == glfw.KEY_Q:
                 glfw.set_window_should_close(self.win, True)
             if key == glfw.KEY_W:
-                GL.glPolygonMode(GL.GL_FRONT_AND_BACK, next(self.fill_modes))
+                gl_state.polygon_mode(next(self.fill_modes))
             if key == glfw.KEY_A:
                 self.state.show_axes = not self.state.show_axes
 
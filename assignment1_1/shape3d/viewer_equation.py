@@ -9,6 +9,8 @@ import matplotlib.pyplot as plt
 
 from tostudents.libs.transform import Trackball
 from tostudents.assignment1_1.shape3d.mesh import EquationSurface
+from tostudents.libs import gl_state
+from tostudents.libs.buffer import CameraBlock
 
 
 class UIState:
@@ -42,6 +44,7 @@ class ViewerEquation:
 
         imgui.create_context()
         self.impl = GlfwRenderer(self.win)
+        self.camera = CameraBlock()     # projection/view shared by every program
 
         self.trackball = Trackball()
         self.mouse = (0, 0)
@@ -64,7 +67,7 @@ class ViewerEquation:
         self._shader_vert = vert
         self._shader_frag = frag
 
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glClearColor(0.05, 0.05, 0.08, 1.0)
 
         glfw.set_key_callback(self.win, self.on_key)
@@ -136,6 +139,7 @@ class ViewerEquation:
             glfw.poll_events()
             self.impl.process_inputs()
             imgui.new_frame()
+            gl_state.begin_frame()
 
             self.render_ui()
 
@@ -143,25 +147,21 @@ class ViewerEquation:
             win_size = glfw.get_window_size(self.win)
             view = self.trackball.view_matrix()
             projection = self.trackball.projection_matrix(win_size)
+            self.camera.update(projection, view)
 
             if self.state.view_modes[self.state.view_mode_idx] == "3D View":
                 # Polygon mode
                 if self.state.render_modes[self.state.render_mode_idx] == "Wireframe":
-                    GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
+                    gl_state.polygon_mode(GL.GL_LINE)
                 else:
-                    GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+                    gl_state.polygon_mode(GL.GL_FILL)
 
                 # Vẽ surface
                 self.surface.draw(projection, view, np.eye(4))
 
                 # Setup shader và uniforms cho việc vẽ điểm
-                GL.glUseProgram(self.surface.shader.render_idx)
-                proj_loc = GL.glGetUniformLocation(self.surface.shader.render_idx, "projection")
-                mv_loc = GL.glGetUniformLocation(self.surface.shader.render_idx, "modelview")
-                if proj_loc != -1:
-                    GL.glUniformMatrix4fv(proj_loc, 1, GL.GL_TRUE, projection)
-                if mv_loc != -1:
-                    GL.glUniformMatrix4fv(mv_loc, 1, GL.GL_TRUE, view)
+                self.surface.uma.upload_uniform_matrix4fv(projection, "projection", True)
+                self.surface.uma.upload_uniform_matrix4fv(view, "modelview", True)
 
                 # **VẼ TẤT CẢ CÁC ĐIỂM CRITICAL**
                 if self.state.critical_points:
@@ -188,7 +188,7 @@ class ViewerEquation:
                         vbo_pos = GL.glGenBuffers(1)
                         vbo_col = GL.glGenBuffers(1)
 
-                        GL.glBindVertexArray(vao)
+                        gl_state.bind_vertex_array(vao)
 
                         # attrib 0: position
                         GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo_pos)
@@ -204,7 +204,7 @@ class ViewerEquation:
 
                         GL.glPointSize(12)
                         GL.glDrawArrays(GL.GL_POINTS, 0, 1)
-                        GL.glBindVertexArray(0)
+                        gl_state.bind_vertex_array(0)
                         GL.glPointSize(1)
 
                         GL.glDeleteBuffers(2, [vbo_pos, vbo_col])
@@ -250,7 +250,7 @@ class ViewerEquation:
                 self.show_contour()
 
             # Reset polygon mode
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+            gl_state.polygon_mode(GL.GL_FILL)
 
             imgui.render()
             self.impl.render(imgui.get_draw_data())
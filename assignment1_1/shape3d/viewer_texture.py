@@ -1,12 +1,15 @@
 import OpenGL.GL as GL
 import glfw
 import numpy as np
-from tostudents.libs.transform import Trackball, translate, rotate, scale
+from tostudents.libs.transform import Trackball, translate, rotate, scale, ModelMatrix
 import imgui
 from imgui.integrations.glfw import GlfwRenderer
 from tostudents.shape3d.basic3d import Sphere
 from tostudents.main.axes import Axes
 import os
+from tostudents.libs import gl_state
+from tostudents.libs import texture
+from tostudents.libs.buffer import CameraBlock
 
 
 class UIState:
@@ -52,6 +55,7 @@ class Viewer:
         # --- ImGui setup ---
         imgui.create_context()
         self.impl = GlfwRenderer(self.win)
+        self.camera = CameraBlock()     # projection/view shared by every program
 
         # --- Trackball camera ---
         self.trackball = Trackball()
@@ -59,6 +63,7 @@ class Viewer:
 
         # --- State ---
         self.state = UIState()
+        self.model = ModelMatrix()      # transform sliders -> model matrix, rebuilt when they move
 
         # --- Axes setup ---
         shader_dir = "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/assignment1_1/3d/shaders/"
@@ -74,7 +79,7 @@ class Viewer:
         self.sphere = Sphere(vert, frag, texture_path=self.state.texture_path).setup()
 
         # --- OpenGL state ---
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glClearColor(0.05, 0.05, 0.08, 1.0)
 
         # --- Callbacks ---
@@ -90,6 +95,8 @@ class Viewer:
             glfw.poll_events()
             self.impl.process_inputs()
             imgui.new_frame()
+            gl_state.begin_frame()
+            texture.process_uploads()       # images decoded in the background, per-frame budget
 
             # --- UI ---
             self.render_ui()
@@ -99,6 +106,7 @@ class Viewer:
             win_size = glfw.get_window_size(self.win)
             view = self.trackball.view_matrix()
             projection = self.trackball.projection_matrix(win_size)
+            self.camera.update(projection, view)
 
             # --- Draw axes ---
             if self.state.show_axes:
@@ -106,13 +114,7 @@ class Viewer:
 
             # --- Transform ---
             s = self.state
-            transform = (
-                translate(s.translate)
-                @ rotate(axis=[1, 0, 0], angle=s.rotate[0])
-                @ rotate(axis=[0, 1, 0], angle=s.rotate[1])
-                @ rotate(axis=[0, 0, 1], angle=s.rotate[2])
-                @ scale(s.scale)
-            )
+            transform = self.model.update(s.translate, s.rotate, s.scale)
 
             # --- Draw sphere ---
             self.sphere.draw(projection, view, transform)
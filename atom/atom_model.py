@@ -1,8 +1,10 @@
 import math
 import numpy as np
 import OpenGL.GL as GL
-from tostudents.libs.transform import translate, scale
+from tostudents.libs.transform import translate, scale, batch_trs
+from tostudents.libs.shader import uniform_location, uniform_locations, bind_camera_block
 from tostudents.shape3d.basic3d import Sphere
+from tostudents.libs import gl_state
 
 
 class AtomModel:
@@ -69,12 +71,12 @@ class AtomModel:
 
             vao = GL.glGenVertexArrays(1)
             vbo = GL.glGenBuffers(1)
-            GL.glBindVertexArray(vao)
+            gl_state.bind_vertex_array(vao)
             GL.glBindBuffer(GL.GL_ARRAY_BUFFER, vbo)
             GL.glBufferData(GL.GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL.GL_STATIC_DRAW)
             GL.glEnableVertexAttribArray(0)
             GL.glVertexAttribPointer(0, 3, GL.GL_FLOAT, False, 0, None)
-            GL.glBindVertexArray(0)
+            gl_state.bind_vertex_array(0)
             self.orbits.append((vao, len(vertices) // 3))
 
             # 3.b Electrons trên shell n (đặt đều theo góc)
@@ -122,6 +124,8 @@ class AtomModel:
         # shader object có thể xoá sau khi link
         GL.glDeleteShader(vert)
         GL.glDeleteShader(frag)
+        uniform_locations(prog)     # introspect active uniforms once, after link
+        bind_camera_block(prog)     # projection/view đến từ Camera UBO dùng chung
         return prog
 
     # ---------------------------------------------------------
@@ -138,33 +142,29 @@ class AtomModel:
     # ---------------------------------------------------------
     def draw(self, projection, view, model):
         # 1) ORBITS (đường trắng) — dùng shader riêng
-        GL.glUseProgram(self.orbit_shader)
-        loc_p = GL.glGetUniformLocation(self.orbit_shader, "projection")
-        loc_v = GL.glGetUniformLocation(self.orbit_shader, "view")
-        loc_m = GL.glGetUniformLocation(self.orbit_shader, "model")
+        gl_state.use_program(self.orbit_shader)
+        loc_m = uniform_location(self.orbit_shader, "model")
         # NumPy row-major → dùng transpose=True
-        GL.glUniformMatrix4fv(loc_p, 1, GL.GL_TRUE, projection)
-        GL.glUniformMatrix4fv(loc_v, 1, GL.GL_TRUE, view)
         GL.glUniformMatrix4fv(loc_m, 1, GL.GL_TRUE, model)
 
         GL.glLineWidth(1.0)  # macOS: nên để 1.0
         # nếu muốn orbit nổi lên trên, có thể tắt depth khi vẽ orbit:
         # GL.glDisable(GL.GL_DEPTH_TEST)
         for vao, count in self.orbits:
-            GL.glBindVertexArray(vao)
+            gl_state.bind_vertex_array(vao)
             GL.glDrawArrays(GL.GL_LINE_LOOP, 0, count)
-        GL.glBindVertexArray(0)
+        gl_state.bind_vertex_array(0)
         # GL.glEnable(GL.GL_DEPTH_TEST)
-        GL.glUseProgram(0)
+        gl_state.use_program(0)
 
         # 2) NUCLEUS — sphere trung tâm
         nucleus_model = model @ scale([self.nucleus_radius] * 3)
         self.nucleus.draw(projection, view, nucleus_model)
 
         # 3) ELECTRONS — spheres nhỏ chạy trên các quỹ đạo
-        for e in self.electrons:
-            r = e["radius"]
-            a = e["angle"]
-            x, z = r * math.cos(a), r * math.sin(a)
-            e_model = model @ translate([x, 0.0, z]) @ scale([self.electron_radius] * 3)
+        radius = np.array([e["radius"] for e in self.electrons], dtype=np.float32)
+        angle = np.array([e["angle"] for e in self.electrons], dtype=np.float32)
+        positions = np.stack([radius * np.cos(angle), np.zeros_like(radius), radius * np.sin(angle)], axis=1)
+        scales = np.full(len(self.electrons), self.electron_radius, dtype=np.float32)
+        for e, e_model in zip(self.electrons, model @ batch_trs(positions, scales=scales)):
             e["obj"].draw(projection, view, e_model)
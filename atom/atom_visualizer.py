@@ -1,7 +1,7 @@
 import math
 import numpy as np
 import OpenGL.GL as GL
-from tostudents.libs.transform import translate, scale, rotate
+from tostudents.libs.transform import translate, scale, rotate, batch_trs
 from tostudents.shape3d.basic3d import Sphere
 # Nếu cylinder của bạn tên khác, sửa lại import sau:
 from tostudents.shape3d.basic3d import Cylinder2 as Cylinder  # <-- đổi về Cylinder nếu cần
@@ -154,8 +154,7 @@ class MoleculeModel:
             b["obj"].draw(projection, view, model @ M)
 
         # 2) Draw atoms — spheres with per-element radius
-        for a in self.atoms:
-            elem = a["elem"]
-            r = self.atom_radius.get(elem, 0.2)
-            M = translate(a["pos"]) @ scale([r, r, r])
-            a["obj"].draw(projection, view, model @ M)
+        radii = [self.atom_radius.get(a["elem"], 0.2) for a in self.atoms]
+        matrices = model @ batch_trs([a["pos"] for a in self.atoms], scales=radii)
+        for a, M in zip(self.atoms, matrices):
+            a["obj"].draw(projection, view, M)
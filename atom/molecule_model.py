@@ -1,7 +1,7 @@
 import math
 import numpy as np
 import OpenGL.GL as GL
-from tostudents.libs.transform import translate, scale, rotate
+from tostudents.libs.transform import translate, scale, rotate, batch_trs
 from tostudents.shape3d.basic3d import Sphere
 # Nếu cylinder của bạn tên khác, sửa lại import sau:
 from tostudents.shape3d.basic3d import Cylinder2 as Cylinder  # <-- đổi về Cylinder nếu cần
@@ -347,10 +347,9 @@ class MoleculeModel:
         # =============================
         # 2️⃣ VẼ NGUYÊN TỬ (ATOMS)
         # =============================
-        for i, a in enumerate(self.atoms):
-            elem = a["elem"]
-            r = self.atom_radius.get(elem, 0.2)
-            anim_pos = animated_positions[i]
-            M = translate(anim_pos) @ scale([r, r, r])
-            a["obj"].draw(projection, view, model @ M)
+        # all atom matrices in one batch: translate(pos) @ scale(r)
+        radii = [self.atom_radius.get(a["elem"], 0.2) for a in self.atoms]
+        matrices = model @ batch_trs(np.asarray(animated_positions), scales=radii)
+        for a, M in zip(self.atoms, matrices):
+            a["obj"].draw(projection, view, M)
 
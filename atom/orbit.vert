@@ -2,10 +2,13 @@
 
 layout(location = 0) in vec3 position;
 
-uniform mat4 projection;
-uniform mat4 view;
+layout(std140) uniform Camera {
+    mat4 projection;
+    mat4 view;
+    mat4 viewProj;
+};
 uniform mat4 model;
 
 void main() {
-    gl_Position = projection * view * model * vec4(position, 1.0);
+    gl_Position = viewProj * model * vec4(position, 1.0);
 }
\ No newline at end of file
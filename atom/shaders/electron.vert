@@ -2,8 +2,11 @@
 layout (location = 0) in vec3 position;
 layout (location = 1) in vec3 normal;
 
-uniform mat4 projection;
-uniform mat4 view;
+layout(std140) uniform Camera {
+    mat4 projection;
+    mat4 view;
+    mat4 viewProj;
+};
 uniform mat4 model;
 
 out vec3 fragNormal;
@@ -13,5 +16,5 @@ void main()
 {
     fragPos = vec3(model * vec4(position, 1.0));
     fragNormal = mat3(transpose(inverse(model))) * normal;
-    gl_Position = projection * view * model * vec4(position, 1.0);
+    gl_Position = viewProj * model * vec4(position, 1.0);
 }
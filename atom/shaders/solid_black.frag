@@ -1,5 +1,3 @@
 #version 330 core
-out vec4 FragColor;
-void main() {
-    FragColor = vec4(0.0, 0.0, 0.0, 1.0);  // Đen
-}
+#define SOLID_COLOR vec3(0.0, 0.0, 0.0)  // Đen
+#include "uber.frag"
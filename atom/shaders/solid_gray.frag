@@ -1,3 +1,3 @@
 #version 330 core
-out vec4 fragColor;
-void main(){ fragColor = vec4(0.7, 0.7, 0.7, 1.0); }
+#define SOLID_COLOR vec3(0.7, 0.7, 0.7)  // Xám
+#include "uber.frag"
@@ -1,5 +1,3 @@
 #version 330 core
-out vec4 FragColor;
-void main() {
-    FragColor = vec4(1.0, 1.0, 1.0, 1.0);  // Trắng
-}
+#define SOLID_COLOR vec3(1.0, 1.0, 1.0)  // Trắng
+#include "uber.frag"
@@ -8,6 +8,8 @@ from tostudents.libs.transform import Trackball
 from tostudents.atom.atom_model import AtomModel
 from tostudents.atom.molecule_model import *
 from tostudents.main.axes import Axes
+from tostudents.libs import gl_state
+from tostudents.libs.buffer import CameraBlock
 
 
 # ==========================================
@@ -58,6 +60,7 @@ class Viewer:
 
         imgui.create_context()
         self.impl = GlfwRenderer(self.win)
+        self.camera = CameraBlock()     # projection/view shared by every program
 
         self.trackball = Trackball()
         self.state = UIState()
@@ -74,7 +77,7 @@ class Viewer:
         glfw.set_cursor_pos_callback(self.win, self.on_mouse_move)
         glfw.set_scroll_callback(self.win, self.on_scroll)
 
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDepthFunc(GL.GL_LESS)
         GL.glClearColor(0.05, 0.05, 0.1, 1.0)
 
@@ -89,6 +92,7 @@ class Viewer:
             glfw.poll_events()
             self.impl.process_inputs()
             imgui.new_frame()
+            gl_state.begin_frame()
 
             self.render_ui()
             self.update_scene(delta_time)
@@ -97,6 +101,7 @@ class Viewer:
             win_size = glfw.get_window_size(self.win)
             view = self.trackball.view_matrix()
             projection = self.trackball.projection_matrix(win_size)
+            self.camera.update(projection, view)
 
             if self.state.show_axes:
                 self.axes.draw(projection, view, np.eye(4))
@@ -142,6 +147,7 @@ class Viewer:
 
         imgui.separator()
         _, self.state.show_axes = imgui.checkbox("Show Axes", self.state.show_axes)
+        imgui.text(gl_state.report())
         imgui.end()
 
     def update_scene(self, delta_time):
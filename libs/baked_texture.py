@@ -0,0 +1,159 @@
+"""
+Pre-baked textures: decoded pixels plus the full mip chain, ready to upload.
+
+    python -m tostudents.libs.baked_texture [--mode L|RGB|RGBA] [--flip] image ...
+
+A baked file sits next to its source image as '<image>.<mode>[-flip].txb'
+and records the size and mtime of the image it was made from, so an edited
+image is decoded again and its baked file rewritten in place. Checking that
+costs one stat, the image itself is not read. The container is raw and
+mapped with np.memmap, every mip level is a view into the mapping and goes
+to glTexImage2D without decoding or copying:
+
+    header   4s magic, uint32 version, channels, levels, uint64 source size, source mtime_ns
+    levels   'levels' rows of uint64 (width, height, offset)
+    data     tightly packed uint8 pixels of each level, level 0 first
+"""
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+MAGIC = b'TXB1'
+VERSION = 2                 # 2: source size and mtime instead of a content hash in the name
+SUFFIX = '.txb'
+
+_HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('channels', '<u4'), ('levels', '<u4'),
+                    ('size', '<u8'), ('mtime', '<u8')])
+_LEVEL = np.dtype([('width', '<u8'), ('height', '<u8'), ('offset', '<u8')])
+
+
+def source_stamp(path):
+    """ (size, mtime_ns) of an image, what its baked file is checked against """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def baked_path(path, flip=False, mode='RGBA'):
+    return '%s.%s%s%s' % (path, mode.lower(), '-flip' if flip else '', SUFFIX)
+
+
+def half(pixels):
+    """ next mip level: 2x2 box filter, sizes halved and floored like GL (min 1) """
+    h, w = pixels.shape[:2]
+    s = pixels.astype(np.uint16)
+    s = s[0:h - 1:2] + s[1:h:2] if h > 1 else s * 2
+    s = s[:, 0:w - 1:2] + s[:, 1:w:2] if w > 1 else s * 2
+    return ((s + 2) >> 2).astype(np.uint8)
+
+
+def mip_chain(pixels):
+    """ [level 0, level 1, ..., 1x1] of a (h, w, channels) uint8 image """
+    levels = [np.ascontiguousarray(pixels)]
+    while levels[-1].shape[0] > 1 or levels[-1].shape[1] > 1:
+        levels.append(half(levels[-1]))
+    return levels
+
+
+def decode(path, flip=False, mode='RGBA'):
+    """ (h, w, channels) uint8 pixels, top row first unless flip """
+    img = Image.open(path)
+    if img.mode != mode:
+        img = img.convert(mode)
+    if flip:
+        img = img.transpose(Image.FLIP_TOP_BOTTOM)
+    pixels = np.asarray(img, dtype=np.uint8)
+    return pixels[:, :, None] if pixels.ndim == 2 else pixels
+
+
+def write(path, levels, source):
+    """ store a mip chain for the image described by source (size, mtime_ns),
+        through a temporary file so readers never see half a file """
+    header = np.zeros(1, _HEADER)
+    header[0] = (MAGIC, VERSION, levels[0].shape[2], len(levels)) + tuple(source)
+    table = np.zeros(len(levels), _LEVEL)
+    offset = _HEADER.itemsize + _LEVEL.itemsize * len(levels)
+    for i, level in enumerate(levels):
+        table[i] = (level.shape[1], level.shape[0], offset)
+        offset += level.nbytes
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for level in levels:
+            f.write(level.tobytes())
+    os.replace(tmp, path)
+
+
+def read(path, source=None):
+    """ mip chain of a baked file as views into a read-only memory map
+
+    source: expected (size, mtime_ns) of the image, ValueError if the file
+            was baked from another version of it
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header = data[:_HEADER.itemsize].view(_HEADER)[0]
+    if header['magic'] != MAGIC or header['version'] != VERSION:
+        raise ValueError('%s: not a baked texture (version %d)' % (path, VERSION))
+    if source is not None and (int(header['size']), int(header['mtime'])) != tuple(source):
+        raise ValueError('%s: stale baked texture' % path)
+    channels, count = int(header['channels']), int(header['levels'])
+    table = data[_HEADER.itemsize:_HEADER.itemsize + _LEVEL.itemsize * count].view(_LEVEL)
+    levels = []
+    for width, height, offset in table:
+        size = int(width) * int(height) * channels
+        levels.append(data[int(offset):int(offset) + size].reshape(int(height), int(width), channels))
+    return levels
+
+
+def bake(path, flip=False, mode='RGBA', force=False):
+    """ path of the baked file for this image, baking it if it is missing or stale """
+    target = baked_path(path, flip, mode)
+    source = source_stamp(path)
+    if not force:
+        try:
+            read(target, source)
+            return target
+        except (OSError, ValueError):
+            pass
+    write(target, mip_chain(decode(path, flip, mode)), source)
+    return target
+
+
+def load(path, flip=False, mode='RGBA'):
+    """ mip chain of the image at path, from its baked file when up to date
+
+    A missing or stale baked file is rebuilt; if it cannot be written
+    (read-only folder, ...) the decoded chain is returned unbaked.
+    """
+    source = source_stamp(path)
+    target = baked_path(path, flip, mode)
+    try:
+        return read(target, source)
+    except (OSError, ValueError):
+        pass
+    levels = mip_chain(decode(path, flip, mode))
+    try:
+        write(target, levels, source)
+    except OSError:
+        pass
+    return levels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bake images into mmap-able textures with mip chains')
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--mode', default='RGBA', choices=['L', 'RGB', 'RGBA'])
+    parser.add_argument('--flip', action='store_true',
+                        help='store rows bottom-up (default top-down, shaders flip v)')
+    parser.add_argument('--force', action='store_true', help='bake again even if up to date')
+    args = parser.parse_args(argv)
+    for image in args.images:
+        target = bake(image, args.flip, args.mode, args.force)
+        print('%s -> %s (%.1f MB)' % (image, target, os.path.getsize(target) / 2**20))
+
+
+if __name__ == '__main__':
+    main()
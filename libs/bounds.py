@@ -0,0 +1,298 @@
+"""
+Bounding volumes of meshes, for culling and picking.
+
+    aabb / bounding_sphere          of a point set
+    transform_aabb / _sphere        the same volume in another space (model matrix)
+    frustum_planes, aabb_visible    view frustum tests
+    BVH                             SAH bounding volume hierarchy over triangles,
+                                    with ray intersection
+    Bounded                         mixin giving a drawable 'aabb', 'bounding_sphere'
+                                    and 'bvh()' from its vertices, computed once
+
+Matrices follow libs/transform.py: column vectors, M @ (x, y, z, 1).
+"""
+import numpy as np
+
+LEAF_SIZE = 4           # BVH nodes with more triangles are split when SAH finds it worth it
+MAX_LEAF = 64           # split above this size whatever the SAH cost
+BINS = 16               # SAH candidate splits per axis
+TRAVERSAL_COST = 1.0    # cost of visiting a node, relative to testing one triangle
+
+
+def aabb(points):
+    """ (lo, hi) float32 corners of the box around points (n, 3) """
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    if not len(points):
+        return np.zeros(3, np.float32), np.zeros(3, np.float32)
+    return points.min(axis=0), points.max(axis=0)
+
+
+def bounding_sphere(points, iterations=64):
+    """ (center, radius) of a sphere around points (n, 3)
+
+    Ritter's sphere (Graphics Gems, 1990), grown toward the farthest outside
+    point a whole pass at a time, or the one centered on the box if smaller.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if not len(points):
+        return np.zeros(3, np.float32), 0.0
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    box_center = (lo + hi) / 2
+    box_radius = np.sqrt(((points - box_center) ** 2).sum(axis=1).max())
+
+    q = points[((points - points[0]) ** 2).sum(axis=1).argmax()]
+    r = points[((points - q) ** 2).sum(axis=1).argmax()]
+    center, radius = (q + r) / 2, np.linalg.norm(r - q) / 2
+    for _ in range(iterations):
+        distance = np.sqrt(((points - center) ** 2).sum(axis=1))
+        far = distance.argmax()
+        if distance[far] <= radius * (1 + 1e-7):
+            break
+        grown = (radius + distance[far]) / 2
+        center = center + (grown - radius) / distance[far] * (points[far] - center)
+        radius = grown
+    else:
+        radius = np.sqrt(((points - center) ** 2).sum(axis=1).max())
+    if box_radius < radius:
+        center, radius = box_center, box_radius
+    return center.astype(np.float32), float(radius)
+
+
+def transform_aabb(lo, hi, matrix):
+    """ (lo, hi) of the box around the box (lo, hi) transformed by a 4x4 affine matrix """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    center = (np.asarray(lo) + np.asarray(hi)) / 2
+    extent = (np.asarray(hi) - np.asarray(lo)) / 2
+    center = matrix[:3, :3] @ center + matrix[:3, 3]
+    extent = np.abs(matrix[:3, :3]) @ extent
+    return (center - extent).astype(np.float32), (center + extent).astype(np.float32)
+
+
+def transform_sphere(center, radius, matrix):
+    """ (center, radius) of the sphere transformed by a 4x4 affine matrix,
+        the radius scaled by the largest axis scale """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    center = matrix[:3, :3] @ np.asarray(center, dtype=np.float64) + matrix[:3, 3]
+    return center.astype(np.float32), float(radius * np.linalg.norm(matrix[:3, :3], axis=0).max())
+
+
+def frustum_planes(matrix):
+    """ (6, 4) inward planes (a, b, c, d) of the frustum of projection @ view
+        (@ model for object space), normalized; a point p is inside when
+        a p.x + b p.y + c p.z + d >= 0 for every plane """
+    m = np.asarray(matrix, dtype=np.float64)
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def aabb_visible(planes, lo, hi):
+    """ False when the box is fully outside one of the planes; lo, hi may be
+        (n, 3) to test n boxes at once """
+    lo, hi = np.asarray(lo), np.asarray(hi)
+    # the corner farthest along each plane normal, (..., 6, 3)
+    corner = np.where(planes[:, :3] >= 0, hi[..., None, :], lo[..., None, :])
+    return ((corner * planes[:, :3]).sum(axis=-1) + planes[:, 3] >= 0).all(axis=-1)
+
+
+def sphere_visible(planes, center, radius):
+    return bool((planes[:, :3] @ np.asarray(center) + planes[:, 3] >= -radius).all())
+
+
+def _at(ufunc, out, index, values):
+    """ ufunc.at on (n, 3) rows, a column at a time (much faster than on rows) """
+    for column in range(out.shape[1]):
+        ufunc.at(out[:, column], index, values[:, column])
+
+
+def _area(lo, hi):
+    """ half surface area of boxes, 0 for empty ones """
+    d = np.maximum(hi - lo, 0)
+    return d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0]
+
+
+class BVH(object):
+    """ Binned SAH bounding volume hierarchy over the triangles of a mesh
+
+    Built a level at a time: every node of a level is binned and split in
+    the same NumPy calls, so the build does about 20 rounds of array work
+    for a million triangles instead of a million Python steps.
+
+    Nodes are arrays: lo, hi (N, 3) boxes; child (N,) the left child (the
+    right one is child + 1) or -1 for leaves; a leaf holds the triangles
+    order[first:first + count].
+    """
+    def __init__(self, positions, indices, leaf_size=LEAF_SIZE, bins=BINS):
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        corners = self.positions[self.triangles]
+        tlo, thi = corners.min(axis=1).astype(np.float64), corners.max(axis=1).astype(np.float64)
+        centroids = (tlo + thi) / 2
+        count = len(self.triangles)
+        capacity = max(1, 2 * count - 1)
+        self.lo = np.zeros((capacity, 3), np.float32)
+        self.hi = np.zeros((capacity, 3), np.float32)
+        self.child = np.full(capacity, -1, np.int64)
+        self.first = np.zeros(capacity, np.int64)
+        self.count = np.zeros(capacity, np.int64)
+        self.order = np.arange(count)
+
+        if count:
+            self.lo[0], self.hi[0] = tlo.min(axis=0), thi.max(axis=0)
+        self.count[0] = count
+        nodes = 1
+        level = np.array([0])               # nodes to consider splitting
+        while len(level):
+            level = level[self.count[level] > leaf_size]
+            if not len(level):
+                break
+            starts, sizes = self.first[level], self.count[level]
+            k = np.repeat(np.arange(len(level)), sizes)
+            rows = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + np.repeat(starts, sizes)
+            tri = self.order[rows]
+            split = self._best_splits(k, len(level), centroids[tri], tlo[tri], thi[tri], bins)
+            cost, axis, at, bin_of, left_lo, left_hi, right_lo, right_hi, left_count = split
+
+            parent_area = np.maximum(_area(self.lo[level], self.hi[level]), 1e-30)
+            go = np.isfinite(cost) & ((TRAVERSAL_COST + cost / parent_area < sizes) | (sizes > MAX_LEAF))
+            # triangles of split nodes: left side first, order within a side kept
+            right = go[k] & (bin_of[np.arange(len(k)), axis[k]] > at[k])
+            self.order[rows] = tri[np.argsort(2 * k + right, kind='stable')]
+
+            level, starts, sizes = level[go], starts[go], sizes[go]
+            left = nodes + 2 * np.arange(len(level))
+            nodes += 2 * len(level)
+            self.child[level] = left
+            for ids, lo, hi, first, size in ((left, left_lo[go], left_hi[go], starts, left_count[go]),
+                                             (left + 1, right_lo[go], right_hi[go], starts + left_count[go],
+                                              sizes - left_count[go])):
+                self.lo[ids], self.hi[ids] = lo, hi
+                self.first[ids], self.count[ids] = first, size
+            level = np.concatenate([left, left + 1])
+        self.nodes = nodes
+        for name in ('lo', 'hi', 'child', 'first', 'count'):
+            setattr(self, name, getattr(self, name)[:nodes])
+
+    @staticmethod
+    def _best_splits(k, n, centroids, tlo, thi, bins):
+        """ cheapest SAH split of each of n nodes, k: node of each triangle
+
+        returns (cost, axis, last left bin, (m, 3) bin of each triangle,
+        left lo, hi, right lo, hi, left count); cost is inf when no split
+        separates the triangles (all centroids in one bin).
+        """
+        cmin = np.full((n, 3), np.inf)
+        cmax = np.full((n, 3), -np.inf)
+        _at(np.minimum, cmin, k, centroids)
+        _at(np.maximum, cmax, k, centroids)
+        extent = cmax - cmin
+        scale = np.divide(bins, extent, out=np.zeros_like(extent), where=extent > 0)
+        bin_of = np.clip(((centroids - cmin[k]) * scale[k]).astype(np.int64), 0, bins - 1)
+
+        best = np.full(n, np.inf)
+        axis = np.zeros(n, np.int64)
+        at = np.zeros(n, np.int64)
+        boxes = [np.zeros((n, 3)) for _ in range(4)]
+        left_count = np.zeros(n, np.int64)
+        nodes = np.arange(n)
+        for a in range(3):
+            flat = k * bins + bin_of[:, a]
+            counts = np.bincount(flat, minlength=n * bins).reshape(n, bins)
+            blo = np.full((n * bins, 3), np.inf)
+            bhi = np.full((n * bins, 3), -np.inf)
+            _at(np.minimum, blo, flat, tlo)
+            _at(np.maximum, bhi, flat, thi)
+            blo, bhi = blo.reshape(n, bins, 3), bhi.reshape(n, bins, 3)
+            # split after bin i: bins [0, i] left, [i + 1, bins) right
+            llo, lhi = np.minimum.accumulate(blo, axis=1), np.maximum.accumulate(bhi, axis=1)
+            rlo = np.minimum.accumulate(blo[:, ::-1], axis=1)[:, ::-1]
+            rhi = np.maximum.accumulate(bhi[:, ::-1], axis=1)[:, ::-1]
+            lcount = np.cumsum(counts, axis=1)
+            rcount = lcount[:, -1:] - lcount
+            with np.errstate(invalid='ignore'):
+                cost = _area(llo[:, :-1], lhi[:, :-1]) * lcount[:, :-1] + _area(rlo[:, 1:], rhi[:, 1:]) * rcount[:, :-1]
+            cost[(lcount[:, :-1] == 0) | (rcount[:, :-1] == 0)] = np.inf
+            i = cost.argmin(axis=1)
+            better = cost[nodes, i] < best
+            best[better] = cost[nodes, i][better]
+            axis[better], at[better] = a, i[better]
+            for box, values in zip(boxes, (llo[nodes, i], lhi[nodes, i], rlo[nodes, i + 1], rhi[nodes, i + 1])):
+                box[better] = values[better]
+            left_count[better] = lcount[nodes, i][better]
+        return (best, axis, at, bin_of) + tuple(boxes) + (left_count,)
+
+    def intersect(self, origin, direction, t_max=np.inf):
+        """ (t, triangle) of the nearest hit of the ray origin + t direction,
+            0 <= t < t_max, or (inf, -1) """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / direction
+        best_t, best = t_max, -1
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            with np.errstate(invalid='ignore'):
+                t0 = (self.lo[node] - origin) * inverse
+                t1 = (self.hi[node] - origin) * inverse
+            near = np.nanmax(np.minimum(t0, t1))
+            far = np.nanmin(np.maximum(t0, t1))
+            if near > far or far < 0 or near >= best_t:
+                continue
+            child = self.child[node]
+            if child >= 0:
+                stack.extend((child + 1, child))
+                continue
+            if not self.count[node]:            # the root leaf of a mesh without triangles
+                continue
+            tris = self.order[self.first[node]:self.first[node] + self.count[node]]
+            t = _ray_triangles(origin, direction, self.positions[self.triangles[tris]])
+            i = t.argmin()
+            if t[i] < best_t:
+                best_t, best = t[i], int(tris[i])
+        return (best_t, best) if best >= 0 else (np.inf, -1)
+
+
+def _ray_triangles(origin, direction, corners):
+    """ hit distance of the ray on each triangle (n, 3, 3), inf on a miss
+        (Moller-Trumbore, both faces) """
+    e1 = corners[:, 1] - corners[:, 0]
+    e2 = corners[:, 2] - corners[:, 0]
+    p = np.cross(direction, e2)
+    det = (e1 * p).sum(axis=1)
+    ok = np.abs(det) > 1e-12
+    inv = np.divide(1.0, det, out=np.zeros_like(det), where=ok)
+    s = origin - corners[:, 0]
+    u = (s * p).sum(axis=1) * inv
+    q = np.cross(s, e1)
+    v = (q * direction).sum(axis=1) * inv
+    t = (e2 * q).sum(axis=1) * inv
+    hit = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+class Bounded(object):
+    """ Mixin for drawables with self.vertices: 'aabb' and 'bounding_sphere'
+        in object space, and an optional BVH, each computed on first use.
+        Meshes not drawn as a triangle list override triangles(). """
+
+    def triangles(self):
+        """ (n, 3) vertex indices of the triangles """
+        return np.asarray(self.indices).reshape(-1, 3)
+
+    @property
+    def aabb(self):
+        if getattr(self, '_aabb', None) is None:
+            self._aabb = aabb(self.vertices)
+        return self._aabb
+
+    @property
+    def bounding_sphere(self):
+        if getattr(self, '_bounding_sphere', None) is None:
+            self._bounding_sphere = bounding_sphere(self.vertices)
+        return self._bounding_sphere
+
+    def bvh(self, leaf_size=LEAF_SIZE):
+        """ BVH over triangles(), built on the first call """
+        if getattr(self, '_bvh', None) is None:
+            self._bvh = BVH(self.vertices, self.triangles(), leaf_size)
+        return self._bvh
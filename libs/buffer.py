@@ -1,6 +1,8 @@
 from tostudents.libs.shader import *
 import OpenGL.GL as GL
 import cv2
+from tostudents.libs import gl_state
+from tostudents.libs import texture
 
 
 
@@ -9,8 +11,8 @@ class VAO(object):
     def __init__(self):
 
         self.vao = GL.glGenVertexArrays(1)
-        GL.glBindVertexArray(self.vao)
-        GL.glBindVertexArray(0)
+        gl_state.bind_vertex_array(self.vao)
+        gl_state.bind_vertex_array(0)
         self.vbo = {}
         self.ebo = None
 
@@ -35,18 +37,138 @@ class VAO(object):
         GL.glBufferData(GL.GL_ELEMENT_ARRAY_BUFFER, indices, GL.GL_STATIC_DRAW)
         self.deactivate()
 
+    def add_vbo_chunks(self, location, chunks, nbytes,
+                       ncomponents=3, dtype=GL.GL_FLOAT, normalized=False, stride=0, offset=None):
+        """ add_vbo for data given as consecutive slices (e.g. memory mapped
+            chunks), streamed one by one into storage of nbytes """
+        self.activate()
+        buffer_idx = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer_idx)
+        _upload_chunks(GL.GL_ARRAY_BUFFER, chunks, nbytes)
+        GL.glVertexAttribPointer(location, ncomponents, dtype, normalized, stride, offset)
+        GL.glEnableVertexAttribArray(location)
+        self.vbo[location] = buffer_idx
+        self.deactivate()
+
+    def add_ebo_chunks(self, chunks, nbytes):
+        """ add_ebo for indices given as consecutive slices """
+        self.activate()
+        self.ebo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        _upload_chunks(GL.GL_ELEMENT_ARRAY_BUFFER, chunks, nbytes)
+        self.deactivate()
+
 
     def __del__(self):
+        gl_state.forget_vertex_array(self.vao)
         GL.glDeleteVertexArrays(1, [self.vao])
         GL.glDeleteBuffers(1, list(self.vbo.values()))
         if self.ebo is not None:
             GL.glDeleteBuffers(1, [self.ebo])
 
     def activate(self):
-        GL.glBindVertexArray(self.vao)  # activated
+        gl_state.bind_vertex_array(self.vao)  # activated
 
     def deactivate(self):
-        GL.glBindVertexArray(0)  # activated
+        gl_state.bind_vertex_array(0)  # activated
+
+# numpy dtype -> GL attribute type; integers reach the shader as floats
+# (normalized or not), as with glVertexAttribPointer in add_vbo
+_GL_TYPES = {np.dtype(np.float32): GL.GL_FLOAT, np.dtype(np.float16): GL.GL_HALF_FLOAT,
+             np.dtype(np.int8): GL.GL_BYTE, np.dtype(np.uint8): GL.GL_UNSIGNED_BYTE,
+             np.dtype(np.int16): GL.GL_SHORT, np.dtype(np.uint16): GL.GL_UNSIGNED_SHORT,
+             np.dtype(np.int32): GL.GL_INT, np.dtype(np.uint32): GL.GL_UNSIGNED_INT}
+
+
+class GrowableVBO(object):
+    """ Vertex buffer of one VAO attribute that data is appended to
+
+    Storage doubles when full: the contents move to a new buffer with
+    glCopyBufferSubData (GPU side) and the attribute is pointed at it, so
+    appending costs amortized one upload of the new data.
+    """
+    def __init__(self, vao, location, ncomponents=3, capacity=2**16, dtype=np.float32, normalized=False):
+        self.vao = vao
+        self.location = location
+        self.ncomponents = ncomponents
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in _GL_TYPES:
+            raise ValueError('GrowableVBO: no GL attribute type for dtype %s' % self.dtype)
+        self.gl_type = _GL_TYPES[self.dtype]
+        self.normalized = normalized
+        self.count = 0                  # rows stored
+        self.capacity = 0
+        self._allocate(capacity)
+
+    @property
+    def row_bytes(self):
+        return self.ncomponents * self.dtype.itemsize
+
+    def _allocate(self, capacity):
+        buffer_idx = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_COPY_WRITE_BUFFER, buffer_idx)
+        GL.glBufferData(GL.GL_COPY_WRITE_BUFFER, capacity * self.row_bytes, None, GL.GL_DYNAMIC_DRAW)
+        old = self.vao.vbo.get(self.location)
+        if old is not None:
+            GL.glBindBuffer(GL.GL_COPY_READ_BUFFER, old)
+            GL.glCopyBufferSubData(GL.GL_COPY_READ_BUFFER, GL.GL_COPY_WRITE_BUFFER, 0, 0, self.count * self.row_bytes)
+            GL.glDeleteBuffers(1, [old])
+        self.vao.activate()
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, buffer_idx)
+        GL.glVertexAttribPointer(self.location, self.ncomponents, self.gl_type, self.normalized, 0, None)
+        GL.glEnableVertexAttribArray(self.location)
+        self.vao.deactivate()
+        self.vao.vbo[self.location] = buffer_idx
+        self.capacity = capacity
+
+    def append(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        if self.count + len(rows) > self.capacity:
+            self._allocate(max(2 * self.capacity, self.count + len(rows)))
+        GL.glBindBuffer(GL.GL_ARRAY_BUFFER, self.vao.vbo[self.location])
+        GL.glBufferSubData(GL.GL_ARRAY_BUFFER, self.count * self.row_bytes, rows.nbytes, rows)
+        self.count += len(rows)
+
+
+def _upload_chunks(target, chunks, nbytes):
+    """ allocate nbytes for the bound buffer, then fill it slice by slice;
+        only one slice needs to be in memory at a time """
+    GL.glBufferData(target, nbytes, None, GL.GL_STATIC_DRAW)
+    position = 0
+    for chunk in chunks:
+        GL.glBufferSubData(target, position, chunk.nbytes, chunk)
+        position += chunk.nbytes
+
+
+class CameraBlock(object):
+    """ std140 uniform buffer holding the camera, uploaded once per frame
+
+    Programs declaring
+        layout(std140) uniform Camera { mat4 projection; mat4 view; mat4 viewProj; };
+    are bound to CAMERA_BINDING at link time (see Shader), so drawables only
+    upload their model matrix.
+    """
+    def __init__(self, binding=CAMERA_BINDING):
+        self.binding = binding
+        self.data = np.zeros((3, 4, 4), dtype=np.float32)   # projection, view, viewProj
+        self.ubo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.ubo)
+        GL.glBufferData(GL.GL_UNIFORM_BUFFER, self.data.nbytes, None, GL.GL_DYNAMIC_DRAW)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+        GL.glBindBufferBase(GL.GL_UNIFORM_BUFFER, self.binding, self.ubo)
+
+    def __del__(self):
+        GL.glDeleteBuffers(1, [self.ubo])
+
+    def update(self, projection, view):
+        # std140 mat4 is column major: store the transpose of numpy's row major matrices
+        self.data[0] = np.transpose(projection)
+        self.data[1] = np.transpose(view)
+        np.matmul(self.data[1], self.data[0], out=self.data[2])   # (P V)^T = V^T P^T
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, self.ubo)
+        GL.glBufferSubData(GL.GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        GL.glBindBuffer(GL.GL_UNIFORM_BUFFER, 0)
+
 
 class UManager(object):
     def __init__(self, shader):
@@ -78,50 +200,67 @@ class UManager(object):
     
     """
     def setup_texture(self, sampler_name, image_file):
-        rgb_image = UManager.load_texture(image_file)
-
-        GL.glUseProgram(self.shader.render_idx) # must call before calling to GL.glUniform1i
-        texture_idx = GL.glGenTextures(1)
+        gl_state.use_program(self.shader.render_idx) # must call before calling to GL.glUniform1i
+        # shared & decoded in the background, a placeholder until texture.process_uploads()
+        texture_idx = texture.load_async(image_file, flip=False, mode='RGB', mipmap=False)
         binding_loc = self._get_texture_loc()
         self.textures[binding_loc] = {}
         self.textures[binding_loc]["id"] = texture_idx
         self.textures[binding_loc]["name"] = sampler_name
 
-        GL.glActiveTexture(GL.GL_TEXTURE0 + binding_loc) # activate texture GL.GL_TEXTURE0, GL.GL_TEXTURE1, ...
-        GL.glBindTexture(GL.GL_TEXTURE_2D, texture_idx)
-        GL.glUniform1i(GL.glGetUniformLocation(self.shader.render_idx, sampler_name), binding_loc)
+        gl_state.bind_texture(texture_idx, binding_loc) # activate texture GL.GL_TEXTURE0, GL.GL_TEXTURE1, ...
+        GL.glUniform1i(self.location(sampler_name), binding_loc)
+
+    def location(self, name):
+        """ cached location of uniform 'name', resolved once per program at link """
+        return self.shader.uniform_location(name)
+
+    """
+    The upload_uniform_* setters take the uniform name, or a location returned
+    by location() to skip even the dict lookup. Uniforms that are not active in
+    the program (location -1) are skipped without calling into the driver.
+    """
+    def _location(self, name):
+        return name if isinstance(name, int) else self.shader.uniform_location(name)
 
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGB,
-                        rgb_image.shape[1], rgb_image.shape[0], 0, GL.GL_RGB, GL.GL_UNSIGNED_BYTE, rgb_image)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+    def upload_camera(self, projection, view):
+        """ per-program projection & view, only for programs without the Camera block """
+        if not self.shader.uses_camera_block:
+            self.upload_uniform_matrix4fv(projection, 'projection', True)
+            self.upload_uniform_matrix4fv(view, 'view', True)
 
     def upload_uniform_matrix4fv(self, matrix, name, transpose=True):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniformMatrix4fv(location, 1, transpose, matrix)
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniformMatrix4fv(location, 1, transpose, matrix)
 
     def upload_uniform_matrix3fv(self, matrix, name, transpose=False):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniformMatrix3fv(location, 1, transpose, matrix)
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniformMatrix3fv(location, 1, transpose, matrix)
 
     def upload_uniform_vector4fv(self, vector, name):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniform4fv(location, 1, vector)
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniform4fv(location, 1, vector)
 
     def upload_uniform_vector3fv(self, vector, name):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniform3fv(location, 1, vector)
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniform3fv(location, 1, vector)
 
     def upload_uniform_scalar1f(self, scalar, name):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniform1f(location, scalar)
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniform1f(location, scalar)
 
     def upload_uniform_scalar1i(self, scalar, name):
-        GL.glUseProgram(self.shader.render_idx)
-        location = GL.glGetUniformLocation(self.shader.render_idx, name)
-        GL.glUniform1i(location, scalar)
\ No newline at end of file
+        gl_state.use_program(self.shader.render_idx)
+        location = self._location(name)
+        if location >= 0:
+            GL.glUniform1i(location, scalar)
@@ -0,0 +1,114 @@
+import OpenGL.GL as GL
+
+
+class GLState(object):
+    """ Shadow copy of the GL state the samples touch
+
+    Every call goes through PyOpenGL, so setting the program, VAO, textures or
+    enable flags to the value they already have is pure overhead. GLState
+    remembers the current values and only calls into GL on change, counting
+    calls issued and skipped since the last begin_frame().
+
+    All code that changes this state must go through here (or call
+    invalidate()), otherwise the shadow copy would lie and a needed call
+    would be skipped.
+    """
+    def __init__(self):
+        self.issued = 0
+        self.skipped = 0
+        self.last_frame = (0, 0)     # (issued, skipped) of the previous frame
+        self.invalidate()
+
+    def invalidate(self):
+        """ forget everything, the next request of each state is issued """
+        self.program = None
+        self.vertex_array = None
+        self.active_unit = None
+        self.textures = {}           # (unit, target) -> texture id
+        self.capabilities = {}       # GL.GL_DEPTH_TEST, ... -> enabled
+        self.polygon = None
+
+    def _changed(self, changed):
+        if changed:
+            self.issued += 1
+        else:
+            self.skipped += 1
+        return changed
+
+    def use_program(self, program):
+        if self._changed(program != self.program):
+            GL.glUseProgram(program)
+            self.program = program
+
+    def bind_vertex_array(self, vertex_array):
+        if self._changed(vertex_array != self.vertex_array):
+            GL.glBindVertexArray(vertex_array)
+            self.vertex_array = vertex_array
+
+    def active_texture(self, unit):
+        if self._changed(unit != self.active_unit):
+            GL.glActiveTexture(GL.GL_TEXTURE0 + unit)
+            self.active_unit = unit
+
+    def bind_texture(self, texture, unit=0, target=GL.GL_TEXTURE_2D):
+        """ bind texture to texture unit 'unit', which is left active """
+        self.active_texture(unit)
+        if self._changed(self.textures.get((unit, target)) != texture):
+            GL.glBindTexture(target, texture)
+            self.textures[(unit, target)] = texture
+
+    def enable(self, capability):
+        if self._changed(self.capabilities.get(capability) is not True):
+            GL.glEnable(capability)
+            self.capabilities[capability] = True
+
+    def disable(self, capability):
+        if self._changed(self.capabilities.get(capability) is not False):
+            GL.glDisable(capability)
+            self.capabilities[capability] = False
+
+    def polygon_mode(self, mode):
+        if self._changed(mode != self.polygon):
+            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, mode)
+            self.polygon = mode
+
+    # object deletion: GL reuses names, so a deleted id must not stay current
+    def forget_program(self, program):
+        if self.program == program:
+            self.program = None
+
+    def forget_vertex_array(self, vertex_array):
+        if self.vertex_array == vertex_array:
+            self.vertex_array = None
+
+    def forget_texture(self, texture):
+        self.textures = {k: v for k, v in self.textures.items() if v != texture}
+
+    def begin_frame(self):
+        """ start counting a new frame, also resyncs with GL in case other
+            code (e.g. the ImGui renderer) changed state behind our back """
+        self.last_frame = (self.issued, self.skipped)
+        self.issued = self.skipped = 0
+        self.invalidate()
+        return self.last_frame
+
+    def report(self):
+        issued, skipped = self.last_frame
+        return 'GL state calls: %d issued, %d skipped' % (issued, skipped)
+
+
+# process wide instance, there is a single context per viewer ----------------
+state = GLState()
+use_program = state.use_program
+bind_vertex_array = state.bind_vertex_array
+active_texture = state.active_texture
+bind_texture = state.bind_texture
+enable = state.enable
+disable = state.disable
+polygon_mode = state.polygon_mode
+forget_program = state.forget_program
+forget_vertex_array = state.forget_vertex_array
+forget_texture = state.forget_texture
+invalidate = state.invalidate
+begin_frame = state.begin_frame
+report = state.report
@@ -0,0 +1,126 @@
+"""
+Index buffer optimizations for triangle lists.
+
+    deduplicate         unique vertex rows and the indices that rebuild the list
+    tipsify             triangle order for the post-transform vertex cache
+                        (Sander, Nehab, Barczak: Fast Triangle Reordering for
+                        Vertex Locality and Reduced Overdraw, 2007)
+    reorder_vertices    vertices renumbered in first-use order, for fetch locality
+    acmr                average cache miss ratio: transformed vertices per
+                        triangle with a FIFO cache, 3.0 worst, ~0.5-0.7 good
+"""
+import numpy as np
+
+CACHE_SIZE = 16
+
+
+def deduplicate(rows):
+    """ (unique rows, int32 indices into them) of a (n, k) integer array
+
+    rows are e.g. the (v, vt, vn) corners of a triangle list: corners equal
+    in every column share one vertex.
+    """
+    rows = np.asarray(rows)
+    if not len(rows):
+        return rows, np.zeros(0, dtype=np.int32)
+    low = rows.min(axis=0).astype(np.int64)
+    span = rows.max(axis=0).astype(np.int64) - low + 1
+    if np.prod(span.astype(float)) < 2**62:
+        # pack each row into one int64 key, much faster than np.unique(axis=0)
+        key = np.zeros(len(rows), dtype=np.int64)
+        for column in range(rows.shape[1]):
+            key = key * span[column] + (rows[:, column] - low[column])
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        return rows[first], inverse.astype(np.int32).ravel()
+    unique, inverse = np.unique(rows, axis=0, return_inverse=True)
+    return unique, inverse.astype(np.int32).ravel()
+
+
+def acmr(indices, cache_size=CACHE_SIZE):
+    """ cache misses per triangle of a triangle list drawn with a FIFO cache """
+    if not len(indices):
+        return 0.0
+    stamp = {}                  # vertex -> miss count when it entered the cache
+    misses = 0
+    for v in np.asarray(indices).tolist():
+        if misses - stamp.get(v, -cache_size) >= cache_size:
+            stamp[v] = misses
+            misses += 1
+    return misses / (len(indices) // 3)
+
+
+def _adjacency(triangles, vertex_count):
+    """ CSR vertex -> triangles: (offsets, triangle ids) """
+    corners = triangles.ravel()
+    order = np.argsort(corners, kind='stable')
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(corners, minlength=vertex_count), out=offsets[1:])
+    return offsets, order // 3
+
+
+def tipsify(indices, vertex_count, cache_size=CACHE_SIZE):
+    """ indices with the triangles reordered by Tipsify, linear time
+
+    Fans around a vertex, then moves on to the vertex of the last fan that
+    will still be in the cache and has the most live triangles left; dead
+    ends fall back to recently used vertices, then to the next unused one.
+    """
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if not len(triangles):
+        return np.asarray(indices, dtype=np.int32)
+    offsets, adjacent = _adjacency(triangles, vertex_count)
+    offsets, adjacent, tri = offsets.tolist(), adjacent.tolist(), triangles.tolist()
+    live = np.diff(offsets).tolist()        # triangles of each vertex not emitted yet
+    cache = [0] * vertex_count              # time each vertex entered the cache
+    emitted = [False] * len(tri)
+    dead_end = []
+    output = []
+    time = cache_size + 1
+    cursor = 0
+    fan = 0
+    while fan >= 0:
+        candidates = []
+        for t in adjacent[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            output.append(t)
+            for v in tri[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - cache[v] > cache_size:
+                    cache[v] = time
+                    time += 1
+        # next fan: a candidate still in the cache after its own fan, oldest first
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = time - cache[v] if time - cache[v] + 2 * live[v] <= cache_size else 0
+                if priority > best:
+                    fan, best = v, priority
+        if fan < 0:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        if fan < 0:
+            while cursor < vertex_count and live[cursor] == 0:
+                cursor += 1
+            fan = cursor if cursor < vertex_count else -1
+    return triangles[output].ravel().astype(np.int32)
+
+
+def reorder_vertices(indices, vertex_count):
+    """ (order, indices): order[new] = old vertex, numbered by first use in
+        indices so consecutive triangles fetch nearby vertices; vertices no
+        triangle uses go last """
+    indices = np.asarray(indices)
+    _, first = np.unique(indices, return_index=True)
+    used = indices[np.sort(first)]
+    unused = np.setdiff1d(np.arange(vertex_count), used)
+    order = np.concatenate([used, unused])
+    remap = np.empty(vertex_count, dtype=np.int32)
+    remap[order] = np.arange(vertex_count, dtype=np.int32)
+    return order, remap[indices]
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import time
+
+import OpenGL.GL as GL
+import numpy as np
+
+
+class ProgramCache(object):
+    """ Persistent cache of linked program binaries (glGetProgramBinary)
+
+    Binaries are keyed by the hash of the shader sources plus the driver's
+    vendor / renderer / version strings, so a driver update or a different
+    GPU simply misses instead of feeding an incompatible blob to the driver.
+    A binary the driver rejects at load time is deleted and the caller falls
+    back to compiling from source.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._driver = None
+        self._supported = None
+
+        # statistics, reported by report()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.load_time = 0.0
+        self.compile_time = 0.0
+
+    def supported(self):
+        """ True if the current context can save and reload program binaries """
+        if self._supported is None:
+            try:
+                formats = GL.glGetIntegerv(GL.GL_NUM_PROGRAM_BINARY_FORMATS)
+                self._supported = bool(GL.glGetProgramBinary) and int(np.ravel(formats)[0]) > 0
+            except Exception:
+                self._supported = False
+        return self._supported
+
+    def driver_id(self):
+        if self._driver is None:
+            names = (GL.GL_VENDOR, GL.GL_RENDERER, GL.GL_VERSION)
+            self._driver = '|'.join(GL.glGetString(name).decode('ascii', 'replace') for name in names)
+        return self._driver
+
+    def key(self, *sources):
+        digest = hashlib.sha1(self.driver_id().encode('utf-8'))
+        for src in sources:
+            digest.update(b'\0')
+            digest.update(src.encode('utf-8') if isinstance(src, str) else src)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    def load(self, key):
+        """ Return a linked program created from the cached binary, or None """
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+
+        start = time.perf_counter()
+        with open(path, 'rb') as f:
+            header = np.frombuffer(f.read(4), dtype=np.uint32)
+            binary = np.frombuffer(f.read(), dtype=np.uint8)
+        if header.size != 1 or binary.size == 0:
+            self._discard(path)
+            return None
+
+        program = GL.glCreateProgram()
+        GL.glProgramBinary(program, int(header[0]), binary, binary.size)
+        if not GL.glGetProgramiv(program, GL.GL_LINK_STATUS):
+            # driver refused the blob (updated driver, changed settings, ...)
+            GL.glDeleteProgram(program)
+            self._discard(path)
+            return None
+
+        self.hits += 1
+        self.load_time += time.perf_counter() - start
+        return program
+
+    def store(self, key, program):
+        """ Save the binary of a linked program, silently skipped if unavailable """
+        length = int(GL.glGetProgramiv(program, GL.GL_PROGRAM_BINARY_LENGTH))
+        if length <= 0:
+            return
+        binary = np.zeros(length, dtype=np.uint8)
+        written = np.zeros(1, dtype=np.int32)
+        binary_format = np.zeros(1, dtype=np.uint32)
+        GL.glGetProgramBinary(program, length, written, binary_format, binary)
+
+        # write to a temporary file first so a crash never leaves a truncated binary
+        path = self._path(key)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(binary_format.tobytes())
+            f.write(binary[:int(written[0])].tobytes())
+        os.replace(tmp, path)
+
+    def _discard(self, path):
+        self.rejected += 1
+        self.misses += 1
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                os.remove(os.path.join(self.directory, name))
+
+    def report(self):
+        return ('program cache: %d hits, %d misses (%d rejected), '
+                'load %.1f ms, compile %.1f ms' % (self.hits, self.misses, self.rejected,
+                                                   self.load_time * 1e3, self.compile_time * 1e3))
+
+
+# process wide cache used by Shader, off unless enabled ----------------------
+CACHE_ENV = 'TOSTUDENTS_PROGRAM_CACHE'
+_default_cache = None
+
+
+def enable(directory=None):
+    """ Turn on the program binary cache for every Shader created afterwards """
+    global _default_cache
+    if directory is None:
+        directory = os.path.join(os.path.expanduser('~'), '.cache', 'tostudents', 'programs')
+    _default_cache = ProgramCache(directory)
+    return _default_cache
+
+
+def disable():
+    global _default_cache
+    _default_cache = None
+
+
+def default_cache():
+    """ Cache enabled with enable() or through the TOSTUDENTS_PROGRAM_CACHE directory """
+    if _default_cache is None and os.environ.get(CACHE_ENV):
+        enable(os.environ[CACHE_ENV])
+    return _default_cache
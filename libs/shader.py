@@ -3,39 +3,136 @@ import numpy as np
 import pandas as pd
 import sys
 import os
+import re
+import time
+
+from tostudents.libs import program_cache
+from tostudents.libs import gl_state
 
 
 class Shader:
-    """ Helper class to create and automatically destroy shader program """
-    def __init__(self, vertex_source, fragment_source):
-        """ Shader can be initialized with raw strings or source file names """
-        self.render_idx = None
-        vert = self._compile_shader(vertex_source, GL.GL_VERTEX_SHADER)
-        frag = self._compile_shader(fragment_source, GL.GL_FRAGMENT_SHADER)
-        if vert and frag:
-            self.render_idx = GL.glCreateProgram()  # pylint: disable=E1111
-            GL.glAttachShader(self.render_idx, vert)
-            GL.glAttachShader(self.render_idx, frag)
-            GL.glLinkProgram(self.render_idx)
-            GL.glDeleteShader(vert)
-            GL.glDeleteShader(frag)
-            status = GL.glGetProgramiv(self.render_idx, GL.GL_LINK_STATUS)
-            if not status:
-                print(GL.glGetProgramInfoLog(self.render_idx).decode('ascii'))
-                sys.exit(1)
+    """ Helper class to create and automatically destroy shader program
+
+    Compiling and linking are only submitted to the driver here, their status
+    is checked when the program is first used (render_idx). With
+    KHR_parallel_shader_compile the driver compiles in background threads, so
+    creating all shaders up front and building geometry meanwhile overlaps
+    the two (see compile_all).
+    """
+    def __init__(self, vertex_source, fragment_source, cache=None, defines=None):
+        """ Shader can be initialized with raw strings or source file names
+
+        cache: ProgramCache to reuse linked binaries from, defaults to the
+               process wide one (see libs/program_cache.py), if enabled
+        defines: {name: value} inserted as #define lines after #version,
+                 to select a variant of an uber-shader (see preprocess)
+        """
+        self._program = None
+        self._pending = None        # shaders still compiling/linking, see _finish()
+        self._uses_camera_block = False
+        vertex_source = self._read_source(vertex_source, defines)
+        fragment_source = self._read_source(fragment_source, defines)
+
+        cache = cache if cache is not None else program_cache.default_cache()
+        if cache is not None and not cache.supported():
+            cache = None
+
+        key = None
+        if cache is not None:
+            key = cache.key(vertex_source, fragment_source)
+            self._program = cache.load(key)
+        if self._program:
+            self._setup()
+        else:
+            self._build(vertex_source, fragment_source, cache, key)
+
+    @property
+    def render_idx(self):
+        """ linked program, waits for the driver on first use after a deferred build """
+        if self._pending is not None:
+            self._finish()
+        return self._program
+
+    @property
+    def uses_camera_block(self):
+        return self.render_idx is not None and self._uses_camera_block
+
+    def ready(self):
+        """ True if render_idx will not block: linked, or the driver reports completion
+            (needs KHR_parallel_shader_compile, without it a pending build is never ready) """
+        if self._pending is None:
+            return True
+        if not parallel_compile():
+            return False
+        return bool(GL.glGetProgramiv(self._program, COMPLETION_STATUS))
+
+    def _build(self, vertex_source, fragment_source, cache, key):
+        """ submit compile and link from source, without waiting for the result """
+        start = time.perf_counter()
+        vert = self._submit_shader(vertex_source, GL.GL_VERTEX_SHADER)
+        frag = self._submit_shader(fragment_source, GL.GL_FRAGMENT_SHADER)
+        self._program = GL.glCreateProgram()  # pylint: disable=E1111
+        GL.glAttachShader(self._program, vert)
+        GL.glAttachShader(self._program, frag)
+        if cache is not None:
+            GL.glProgramParameteri(self._program, GL.GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL.GL_TRUE)
+        GL.glLinkProgram(self._program)
+        self._pending = ((vert, vertex_source, GL.GL_VERTEX_SHADER),
+                         (frag, fragment_source, GL.GL_FRAGMENT_SHADER), cache, key, start)
+
+    def _finish(self):
+        """ query the deferred compile/link status, storing the binary in cache if any """
+        vertex, fragment, cache, key, start = self._pending
+        self._pending = None
+        for shader, src, shader_type in (vertex, fragment):
+            self._check_shader(shader, src, shader_type)
+        status = GL.glGetProgramiv(self._program, GL.GL_LINK_STATUS)
+        GL.glDeleteShader(vertex[0])        # flagged, freed with the program
+        GL.glDeleteShader(fragment[0])
+        if not status:
+            print(GL.glGetProgramInfoLog(self._program).decode('ascii'))
+            sys.exit(1)
+        if cache is not None:
+            cache.compile_time += time.perf_counter() - start
+            cache.store(key, self._program)
+        self._setup()
+
+    def _setup(self):
+        uniform_locations(self._program)      # introspect active uniforms once, after link
+        self._uses_camera_block = bind_camera_block(self._program)
 
     def __del__(self):
-        GL.glUseProgram(0)
-        if self.render_idx:                      # if this is a valid shader object
-            GL.glDeleteProgram(self.render_idx)  # object dies => destroy GL object
+        gl_state.use_program(0)
+        if self._pending is not None:
+            GL.glDeleteShader(self._pending[0][0])
+            GL.glDeleteShader(self._pending[1][0])
+        if self._program:                        # if this is a valid shader object
+            forget_program(self._program)        # ids get reused by the driver
+            gl_state.forget_program(self._program)
+            GL.glDeleteProgram(self._program)    # object dies => destroy GL object
+
+    def uniform_location(self, name):
+        """ cached location of uniform 'name', -1 if not an active uniform """
+        return uniform_locations(self.render_idx).get(name, -1)
 
     @staticmethod
-    def _compile_shader(src, shader_type):
-        src = open(src, 'r').read() if os.path.exists(src) else src
+    def _read_source(src, defines=None):
+        directory = None
+        if os.path.exists(src):
+            directory = os.path.dirname(os.path.abspath(src))
+            src = open(src, 'r').read()
         src = src.decode('ascii') if isinstance(src, bytes) else src
+        return preprocess(src, defines, directory)
+
+    @staticmethod
+    def _submit_shader(src, shader_type):
         shader = GL.glCreateShader(shader_type)
         GL.glShaderSource(shader, src)
         GL.glCompileShader(shader)
+        return shader
+
+    @staticmethod
+    def _check_shader(shader, src, shader_type):
         status = GL.glGetShaderiv(shader, GL.GL_COMPILE_STATUS)
         src = ('%3d: %s' % (i + 1, l) for i, l in enumerate(src.splitlines()))
         if not status:
@@ -44,4 +141,218 @@ class Shader:
             src = '\n'.join(src)
             print('Compile failed for %s\n%s\n%s' % (shader_type, log, src))
             sys.exit(1)
+
+    @staticmethod
+    def _compile_shader(src, shader_type):
+        src = Shader._read_source(src)
+        shader = Shader._submit_shader(src, shader_type)
+        Shader._check_shader(shader, src, shader_type)
+        return shader
+
+
+# parallel compilation (KHR/ARB_parallel_shader_compile) ------------------------
+COMPLETION_STATUS = 0x91B1      # GL_COMPLETION_STATUS_KHR, same value for ARB
+_parallel = None
+
+
+def _max_compiler_threads():
+    """ glMaxShaderCompilerThreads{KHR,ARB} if the driver has the extension, else None """
+    try:
+        from OpenGL.GL.KHR import parallel_shader_compile as khr
+        if khr.glInitParallelShaderCompileKHR():
+            return khr.glMaxShaderCompilerThreadsKHR
+    except ImportError:
+        pass
+    try:
+        from OpenGL.GL.ARB import parallel_shader_compile as arb
+        if arb.glInitParallelShaderCompileARB():
+            return arb.glMaxShaderCompilerThreadsARB
+    except ImportError:
+        pass
+    return None
+
+
+def parallel_compile():
+    """ True if the driver compiles shaders in background threads
+
+    Checked once per process (there is a single context per viewer); the
+    driver is allowed to use as many threads as it wants.
+    """
+    global _parallel
+    if _parallel is None:
+        max_threads = _max_compiler_threads()
+        _parallel = max_threads is not None
+        if _parallel:
+            max_threads(0xFFFFFFFF)
+    return _parallel
+
+
+def compile_all(pairs, **defines):
+    """ Submit every (vertex, fragment) pair through shader_variant at once
+
+    Nothing waits on the driver here: status is checked when each program is
+    first used, so geometry built after this call overlaps the compilation.
+    Returns the Shader objects, in order.
+    """
+    parallel_compile()              # before the first glCompileShader
+    return [shader_variant(vert, frag, **defines) for vert, frag in pairs]
+
+
+def clear_variants():
+    """ Delete every shared program, to call before their context is destroyed """
+    _variant_sets.clear()
+
+
+def finish_all():
+    """ Wait for every shared program still compiling, e.g. before timing startup """
+    for variants in _variant_sets.values():
+        for shader in variants.variants.values():
+            shader.render_idx
+
+
+# #include / #define preprocessing --------------------------------------------
+SHADER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shaders')
+INCLUDE_PATH = [SHADER_DIR]         # searched after the including file's directory
+DEFAULT_VERSION = '#version 330 core'
+
+_INCLUDE = re.compile(r'^[ \t]*#[ \t]*include[ \t]+["<]([^">]+)[">][^\n]*$', re.M)
+_VERSION = re.compile(r'^[ \t]*#[ \t]*version[^\n]*\n?', re.M)
+
+
+def _find_include(name, directory):
+    for folder in ([directory] if directory else []) + INCLUDE_PATH:
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            return os.path.abspath(path)
+    raise FileNotFoundError('#include "%s": not found in %s' % (name, [directory] + INCLUDE_PATH))
+
+
+def _expand_includes(src, directory, seen):
+    def include(match):
+        path = _find_include(match.group(1), directory)
+        if path in seen:                # every file is included once, like #pragma once
+            return ''
+        seen.add(path)
+        with open(path, 'r') as f:
+            return _expand_includes(f.read(), os.path.dirname(path), seen)
+    return _INCLUDE.sub(include, src)
+
+
+def preprocess(src, defines=None, directory=None):
+    """ GLSL source with its #include lines expanded and defines inserted
+
+    #include "file" is looked up relative to 'directory' (the including
+    file's folder), then in INCLUDE_PATH. defines {name: value} become
+    '#define name value' lines ('#define name' for True) right after the
+    #version line, which is added if the source has none.
+    """
+    if '#' not in src and not defines:
+        return src
+    src = _expand_includes(src, directory, set())
+    version = _VERSION.search(src)
+    if version is not None:
+        head, src = version.group(0).rstrip('\n'), src[:version.start()] + src[version.end():]
+    else:
+        head = DEFAULT_VERSION
+    lines = [head]
+    for name, value in sorted((defines or {}).items()):
+        lines.append('#define %s' % name if value is True else '#define %s %s' % (name, value))
+    return '\n'.join(lines) + '\n' + src
+
+
+# variants of an uber-shader, compiled lazily on first use --------------------
+class ShaderVariants(object):
+    """ Programs built from one vertex/fragment source pair, one per define set
+
+    Each permutation is compiled on first request and kept, so switching back
+    and forth between variants (e.g. render modes) never recompiles.
+    """
+    def __init__(self, vertex_source, fragment_source):
+        self.vertex_source = vertex_source
+        self.fragment_source = fragment_source
+        self.variants = {}      # frozenset(defines.items()) -> Shader
+
+    def get(self, **defines):
+        key = frozenset(defines.items())
+        shader = self.variants.get(key)
+        if shader is None:
+            shader = Shader(self.vertex_source, self.fragment_source, defines=defines)
+            self.variants[key] = shader
         return shader
+
+    def __len__(self):
+        return len(self.variants)
+
+
+_variant_sets = {}          # (vertex source, fragment source) -> ShaderVariants
+
+
+def shader_variant(vertex_source, fragment_source, **defines):
+    """ Shared, lazily compiled program for these sources and defines
+
+    Drawables using the same shader files share a single program instead of
+    each compiling their own copy.
+    """
+    key = (vertex_source, fragment_source)
+    variants = _variant_sets.get(key)
+    if variants is None:
+        variants = _variant_sets[key] = ShaderVariants(vertex_source, fragment_source)
+    return variants.get(**defines)
+
+
+# uniform locations, resolved once per program --------------------------------
+_uniform_locations = {}     # program id -> {uniform name: location}
+
+
+def uniform_locations(program):
+    """ name -> location of every active uniform of a linked program
+
+    The active uniforms are introspected once (Shader does it right after
+    link), then served from a dict, so draw calls never go through the driver's string
+    lookup. Arrays are reachable as 'name', 'name[0]', 'name[1]', ...
+    Uniforms that live in a uniform block have no location and are left out.
+    """
+    locations = _uniform_locations.get(program)
+    if locations is not None:
+        return locations
+
+    locations = {}
+    for index in range(GL.glGetProgramiv(program, GL.GL_ACTIVE_UNIFORMS)):
+        name, size, _ = GL.glGetActiveUniform(program, index)
+        name = name.decode('ascii') if isinstance(name, bytes) else name
+        location = GL.glGetUniformLocation(program, name)
+        if location < 0:
+            continue
+        locations[name] = location
+        if name.endswith('[0]'):
+            base = name[:-3]
+            locations[base] = location
+            for i in range(1, size):
+                element = '%s[%d]' % (base, i)
+                locations[element] = GL.glGetUniformLocation(program, element)
+    _uniform_locations[program] = locations
+    return locations
+
+
+def uniform_location(program, name):
+    """ cached location of uniform 'name' in program, -1 if it is not active """
+    return uniform_locations(program).get(name, -1)
+
+
+def forget_program(program):
+    """ drop cached locations, to call when a program is deleted """
+    _uniform_locations.pop(program, None)
+
+
+# shared per-frame camera uniform block, see CameraBlock in libs/buffer.py -----
+CAMERA_BLOCK = 'Camera'
+CAMERA_BINDING = 0          # fixed uniform buffer binding point of the block
+
+
+def bind_camera_block(program):
+    """ attach the program's "Camera" block to CAMERA_BINDING, False if it has none """
+    index = GL.glGetUniformBlockIndex(program, CAMERA_BLOCK)
+    if index == GL.GL_INVALID_INDEX:
+        return False
+    GL.glUniformBlockBinding(program, index, CAMERA_BINDING)
+    return True
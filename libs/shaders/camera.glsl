@@ -0,0 +1,6 @@
+// shared per-frame camera, filled once per frame by CameraBlock (libs/buffer.py)
+layout(std140) uniform Camera {
+    mat4 projection;
+    mat4 view;
+    mat4 viewProj;
+};
@@ -0,0 +1,60 @@
+// uber fragment shader, same #define flags as uber.vert:
+//   VERTEX_COLOR   interpolated vertex color
+//   PHONG          phong lighting of the vertex color
+//   TEXTURE        texture lookup
+//   (none)         uniform color, defaults to SOLID_COLOR (white)
+out vec4 frag_color;
+
+#if defined(PHONG)
+in vec3 v_position;  // World space position
+in vec3 v_normal;    // World space normal
+in vec3 v_color;
+
+// Light and view positions in world space
+uniform vec3 light_pos = vec3(3.0, 3.0, 3.0);
+uniform vec3 view_pos = vec3(0.0, 0.0, 5.0);
+uniform float ka = 0.1;
+uniform float kd = 0.8;
+uniform float ks = 0.5;
+uniform float shininess = 32.0;
+
+void main() {
+    vec3 N = normalize(v_normal);
+    vec3 L = normalize(light_pos - v_position);
+    vec3 V = normalize(view_pos - v_position);
+    vec3 R = reflect(-L, N);
+
+    vec3 ambient = ka * v_color;
+    float diff = max(dot(N, L), 0.0);
+    vec3 diffuse = kd * diff * v_color;
+    float spec = pow(max(dot(R, V), 0.0), shininess);
+    vec3 specular = ks * spec * vec3(1.0);
+
+    frag_color = vec4(ambient + diffuse + specular, 1.0);
+}
+
+#elif defined(TEXTURE)
+in vec2 v_texcoord;
+uniform sampler2D tex;
+
+void main() {
+    frag_color = texture(tex, v_texcoord);
+}
+
+#elif defined(VERTEX_COLOR)
+in vec3 v_color;
+
+void main() {
+    frag_color = vec4(v_color, 1.0);
+}
+
+#else
+#ifndef SOLID_COLOR
+#define SOLID_COLOR vec3(1.0, 1.0, 1.0)
+#endif
+uniform vec3 color = SOLID_COLOR;
+
+void main() {
+    frag_color = vec4(color, 1.0);
+}
+#endif
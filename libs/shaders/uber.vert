@@ -0,0 +1,44 @@
+// uber vertex shader, the feature set is chosen with #define flags:
+//   VERTEX_COLOR   pass the per-vertex color (flat, gouraud)
+//   PHONG          also world space position & normal, per-pixel lighting
+//   TEXTURE        pass the texture coordinates, v flipped: textures are
+//                  uploaded top row first (libs/texture.py), so the flip
+//                  costs nothing here instead of a copy of every image
+//   (none)         position only (wireframe, solid color)
+#include "camera.glsl"
+
+layout(location = 0) in vec3 a_position;
+layout(location = 1) in vec3 a_color;
+layout(location = 2) in vec3 a_normal;
+layout(location = 3) in vec2 a_texcoord;
+
+uniform mat4 model;
+
+#if defined(VERTEX_COLOR) || defined(PHONG)
+out vec3 v_color;
+#endif
+#ifdef PHONG
+out vec3 v_position;
+out vec3 v_normal;
+#endif
+#ifdef TEXTURE
+out vec2 v_texcoord;
+#endif
+
+void main() {
+    vec4 world_pos = model * vec4(a_position, 1.0);
+    gl_Position = viewProj * world_pos;
+
+#if defined(VERTEX_COLOR) || defined(PHONG)
+    v_color = a_color;
+#endif
+#ifdef PHONG
+    // position & normal in world space for lighting calculations
+    v_position = vec3(world_pos);
+    mat3 normal_matrix = mat3(transpose(inverse(model)));
+    v_normal = normalize(normal_matrix * a_normal);
+#endif
+#ifdef TEXTURE
+    v_texcoord = vec2(a_texcoord.x, 1.0 - a_texcoord.y);
+#endif
+}
@@ -0,0 +1,215 @@
+"""
+Quadric error mesh simplification of indexed triangle lists.
+
+    simplify            fewer triangles over the same vertex array
+    lods                a chain of simplified index buffers, each from the previous
+    strip_to_triangles  triangle list of a GL_TRIANGLE_STRIP index buffer
+
+Garland and Heckbert's quadric error metric (Surface Simplification Using
+Quadric Error Metrics, 1997) with half-edge collapses: a vertex moves onto a
+neighbor, so no vertex is created and the vertex buffer (positions, uvs,
+normals, colors) is shared by every level of detail. Instead of one collapse
+at a time from a priority queue, each pass collapses in bulk every vertex
+whose cost is lower than all its neighbors', all in NumPy.
+
+Boundary vertices and UV seam vertices (several vertices at one position,
+e.g. ObjLoader's (v, vt, vn) corners or a texture's wrap column) never move,
+so borders and seams keep their exact shape and texture coordinates.
+"""
+import numpy as np
+
+MAX_PASSES = 64
+ROUNDS = 4                  # independent set rounds per pass
+MIN_COS = 0.2               # smallest cosine between a triangle's normals before and after a collapse
+MIN_QUALITY = 0.05          # collapses may not make triangles thinner than this (see _quality)
+
+# upper triangle of the symmetric 4x4 quadric, row major
+_UPPER = [(0, 0), (0, 1), (0, 2), (0, 3), (1, 1), (1, 2), (1, 3), (2, 2), (2, 3), (3, 3)]
+
+
+def strip_to_triangles(indices):
+    """ triangle list indices of a triangle strip, odd triangles rewound,
+        degenerate (restart) triangles dropped """
+    indices = np.asarray(indices)
+    if len(indices) < 3:
+        return np.zeros(0, dtype=np.int32)
+    tris = np.stack([indices[:-2], indices[1:-1], indices[2:]], axis=1)
+    tris[1::2, [0, 1]] = tris[1::2, [1, 0]]
+    keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+    return tris[keep].ravel().astype(np.int32)
+
+
+def _plane_quadrics(positions, tris):
+    """ (T, 10) quadric of the plane of each triangle, see _UPPER """
+    p = positions[tris]
+    n = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    n = np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+    plane = np.concatenate([n, -np.einsum('ij,ij->i', n, p[:, 0])[:, None]], axis=1)
+    return np.stack([plane[:, i] * plane[:, j] for i, j in _UPPER], axis=1)
+
+
+def _cost(q, p):
+    """ v^T Q v for v = (p, 1), q in _UPPER layout """
+    x, y, z = p[:, 0], p[:, 1], p[:, 2]
+    return (q[:, 0] * x * x + 2 * q[:, 1] * x * y + 2 * q[:, 2] * x * z + 2 * q[:, 3] * x
+            + q[:, 4] * y * y + 2 * q[:, 5] * y * z + 2 * q[:, 6] * y
+            + q[:, 7] * z * z + 2 * q[:, 8] * z + q[:, 9])
+
+
+def _quality(p, normal):
+    """ 4 sqrt(3) area / sum of squared edges: 1 equilateral, 0 degenerate """
+    edges = ((p[:, 1] - p[:, 0]) ** 2 + (p[:, 2] - p[:, 1]) ** 2 + (p[:, 0] - p[:, 2]) ** 2).sum(axis=1)
+    return 2 * np.sqrt(3) * np.linalg.norm(normal, axis=1) / np.maximum(edges, 1e-300)
+
+
+def _welds(positions, weld):
+    """ weld id of each vertex: vertices at one position share it """
+    if weld is not None:
+        return np.asarray(weld, dtype=np.int64)
+    _, weld = np.unique(positions, axis=0, return_inverse=True)
+    return weld.ravel().astype(np.int64)
+
+
+def _collapses(positions, tris, quadrics, weld, locked, budget, max_cost, rng):
+    """ (removed, target) vertices of one pass: local cost minima among their
+        neighbors, whose collapse neither flips a triangle nor pinches the
+        surface, cheapest first, at most 'budget' of them """
+    count = len(positions)
+    edges = tris[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    # undirected edges, sorted, and how many triangles use each
+    keys = np.sort(edges.min(axis=1) * count + edges.max(axis=1))
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    uses = np.diff(np.r_[starts, len(keys)])
+    keys = keys[starts]
+    # an edge of one triangle only is a border: its ends stay
+    fixed = locked.copy()
+    fixed[keys[uses == 1] // count] = fixed[keys[uses == 1] % count] = True
+    src = np.concatenate([keys // count, keys % count])        # both directions
+    dst = np.concatenate([keys % count, keys // count])
+
+    movable = ~fixed[src]
+    a, b = src[movable], dst[movable]
+    if not len(a):
+        return a, b
+    cost = _cost(quadrics[weld[a]] + quadrics[weld[b]], positions[b])
+    # cheapest target of each vertex
+    lowest = np.full(count, np.inf)
+    np.minimum.at(lowest, a, cost)
+    best = cost == lowest[a]
+    if max_cost is not None:
+        best &= cost <= max_cost
+    target = np.full(count, -1, dtype=np.int64)
+    target[a[best]] = b[best]
+    a = np.flatnonzero(target >= 0)
+    b, cost = target[a], lowest[a]
+
+    # link condition: a and b must share exactly the two neighbors of their triangles
+    around = (target[src] >= 0) & (dst != target[src])
+    n, m = dst[around], target[src[around]]
+    pair = np.minimum(n, m) * count + np.maximum(n, m)
+    shared = keys[np.minimum(np.searchsorted(keys, pair), len(keys) - 1)] == pair
+    ok = np.zeros(count, dtype=bool)
+    ok[a] = np.bincount(src[around][shared], minlength=count)[a] == 2
+
+    # no flip: triangles around a keep their orientation when a moves onto b
+    t, corner = np.nonzero(target[tris] >= 0)
+    moved = tris[t, corner]
+    keep = ~(tris[t] == target[moved][:, None]).any(axis=1)    # those that vanish can't flip
+    t, corner, moved = t[keep], corner[keep], moved[keep]
+    p = positions[tris[t]]
+    before = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    p[np.arange(len(t)), corner] = positions[target[moved]]
+    after = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    # nor turn them by more than ~80 degrees, nor make slivers
+    turned = np.einsum('ij,ij->i', before, after) <= MIN_COS * (np.linalg.norm(before, axis=1)
+                                                               * np.linalg.norm(after, axis=1))
+    quality = _quality(p, after)
+    ok[moved[turned | ((quality < MIN_QUALITY) & (quality < _quality(positions[tris[t]], before)))]] = False
+
+    valid = ok[a]
+    a, b, cost = a[valid], b[valid], cost[valid]
+    # the cheaper half (a smooth surface has smooth costs, too few local
+    # minima to pick those only), then an independent set of them: no two
+    # adjacent, so every triangle changes by one vertex at most
+    cheap = np.argsort(cost, kind='stable')[:max(1, len(a) // 2)]
+    a, b, cost = a[cheap], b[cheap], cost[cheap]
+    priority = np.full(count, np.inf)
+    priority[a] = rng.random(len(a))
+    chosen = np.zeros(count, dtype=bool)
+    for _ in range(ROUNDS):
+        lowest = priority.copy()
+        np.minimum.at(lowest, src, priority[dst])
+        picked = np.isfinite(priority) & (priority == lowest)
+        if not picked.any():
+            break
+        chosen |= picked
+        blocked = picked.copy()
+        blocked[dst[picked[src]]] = True
+        priority[blocked] = np.inf
+    keep = chosen[a]
+    a, b, cost = a[keep], b[keep], cost[keep]
+    cheapest = np.argsort(cost, kind='stable')[:budget]
+    return a[cheapest], b[cheapest]
+
+
+def simplify(positions, indices, target=None, error=None, weld=None, locked=None):
+    """ int32 triangle list indices of a simplified mesh, over the same vertices
+
+    positions: (V, 3) vertex positions
+    indices: triangle list into positions (see strip_to_triangles for strips)
+    target: triangle count to get down to (default: as few as 'error' allows)
+    error: largest distance a collapse may move the surface from the planes
+           of the original triangles it gathered (sum of squared distances
+           compared to error ** 2); None: no bound
+    weld: (V,) ids, vertices with the same id are one point of the surface
+          split by attributes (e.g. obj_parser's v index); default: equal
+          positions
+    locked: (V,) bool, vertices that must stay
+
+    Stops when the target is reached or no allowed collapse is left.
+    """
+    positions = np.asarray(positions, dtype=np.float64)
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if target is None and error is None:
+        raise ValueError('simplify: give a target triangle count or an error bound')
+    target = 0 if target is None else int(target)
+    max_cost = None if error is None else float(error) ** 2
+    weld = _welds(positions, weld)
+    locked = np.zeros(len(positions), dtype=bool) if locked is None else np.array(locked, dtype=bool)
+    # seams: a position held by several used vertices
+    used = np.unique(tris)
+    _, group, size = np.unique(weld[used], return_inverse=True, return_counts=True)
+    locked[used[size[group.ravel()] > 1]] = True
+
+    quadrics = np.zeros((weld.max() + 1 if len(weld) else 0, len(_UPPER)))
+    corner_quadrics = np.repeat(_plane_quadrics(positions, tris), 3, axis=0)
+    np.add.at(quadrics, weld[tris.ravel()], corner_quadrics)
+
+    rng = np.random.default_rng(0)         # independent set order, same result every call
+    for _ in range(MAX_PASSES):
+        if len(tris) <= target:
+            break
+        # an interior collapse removes two triangles
+        a, b = _collapses(positions, tris, quadrics, weld, locked, max(1, (len(tris) - target + 1) // 2), max_cost, rng)
+        if not len(a):
+            break
+        np.add.at(quadrics, weld[b], quadrics[weld[a]])
+        remap = np.arange(len(positions))
+        remap[a] = b
+        tris = remap[tris]
+        tris = tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])]
+    return tris.ravel().astype(np.int32)
+
+
+def lods(positions, indices, ratios=(0.5, 0.25, 0.125), error=None, weld=None, locked=None):
+    """ [indices of each level], level i has about ratios[i] of the triangles
+        of 'indices'; each level is simplified from the one before, so the
+        cost of the chain is about that of the first level """
+    levels = []
+    count = len(indices) // 3
+    weld = _welds(np.asarray(positions), weld)
+    for ratio in ratios:
+        indices = simplify(positions, indices, int(count * ratio), error, weld, locked)
+        levels.append(indices)
+    return levels
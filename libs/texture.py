@@ -0,0 +1,429 @@
+import ctypes
+import math
+import os
+import queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import OpenGL.GL as GL
+import numpy as np
+from PIL import Image
+
+from tostudents.libs import gl_state
+from tostudents.libs import baked_texture
+
+# mode -> (sized internal format, pixel format); no padding channel is added
+_FORMATS = {
+    'L': (GL.GL_R8, GL.GL_RED),
+    'RGB': (GL.GL_RGB8, GL.GL_RGB),
+    'RGBA': (GL.GL_RGBA8, GL.GL_RGBA),
+}
+
+
+class TextureCache(object):
+    """ Process wide cache of GL textures, keyed by path, mtime and options
+
+    Loading an image that is already resident returns the same texture and
+    costs nothing. Each load() takes a reference that release() gives back;
+    textures nobody references stay resident for reuse until the total GPU
+    memory goes over 'budget' bytes, then the least recently used ones are
+    deleted. A modified file has a new mtime, so it is reloaded.
+
+    load_async() returns at once with a texture showing a placeholder; the
+    image is decoded on a thread pool and uploaded into that same texture
+    by process_uploads(), which the render loop calls once per frame.
+
+    Rows are uploaded in image order (top row first) without flipping, so
+    v = 0 is the top of the image: shaders flip v instead (see uber.vert).
+
+    With 'bake' on, images are read from their pre-baked file (decoded
+    pixels and mip chain, see libs/baked_texture.py), baked on first use.
+
+    With 'pbo' on, process_uploads() copies the pixels into a mapped pixel
+    buffer and the texture upload is sourced from it, so the driver does not
+    block on client memory. A fence marks the end of the transfer, then the
+    texture counts as resident (see resident()) and the buffer is reused.
+    """
+    def __init__(self, budget=256 * 2**20, upload_budget=16 * 2**20, workers=None, bake=True, pbo=True):
+        self.budget = budget
+        self.bake = bake
+        self.pbo = pbo
+        self.upload_budget = upload_budget  # bytes uploaded per process_uploads() call
+        self.entries = OrderedDict()    # key -> [texture, nbytes, refs], oldest first
+        self.keys = {}                  # texture id -> key
+        self.used = 0                   # bytes of all resident textures
+
+        self.workers = workers          # decoding threads, None: executor default
+        self._executor = None
+        self._decoded = queue.Queue()   # (texture, pixels, options) ready to upload
+        self._pending = set()           # textures not resident yet: decoding or in transfer
+        self._in_flight = []            # [texture, pbo, pbo size, fence] uploads sourced from a PBO
+        self._free_pbos = []            # (pbo, nbytes) ready for reuse
+
+        # statistics, reported by report()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(path, **options):
+        path = os.path.abspath(path)
+        return (path, os.stat(path).st_mtime_ns, tuple(sorted(options.items())))
+
+    def load(self, path, flip=False, mode='RGBA', mipmap=True, wrap=GL.GL_REPEAT):
+        """ texture id of the image at path, uploaded on the first request only
+
+        flip: flip the rows, costs a full copy of the image (unless baked);
+              prefer flipping v in the shader
+        mode: 'L' (one channel, R8), 'RGB' or 'RGBA' GPU format
+        """
+        key = self.key(path, flip=flip, mode=mode, mipmap=mipmap, wrap=wrap)
+        texture = self._hit(key)
+        if texture is not None:
+            return texture
+
+        self.misses += 1
+        levels = self._levels(path, flip, mode, mipmap)
+        height, width = levels[0].shape[:2]
+        texture = GL.glGenTextures(1)
+        nbytes = _allocate(texture, width, height, mode, mipmap, wrap)
+        _upload(texture, levels, mode, mipmap)
+        self._insert(key, texture, nbytes)
+        return texture
+
+    def load_async(self, path, flip=False, mode='RGBA', mipmap=True, wrap=GL.GL_REPEAT):
+        """ like load(), but returns before decoding. The texture shows a gray
+            placeholder until process_uploads() uploads the image: a mipmapped
+            one its 1x1 level of the storage allocated from the image header,
+            another a 1x1 level 0 its storage replaces at upload """
+        key = self.key(path, flip=flip, mode=mode, mipmap=mipmap, wrap=wrap)
+        texture = self._hit(key)
+        if texture is not None:
+            return texture
+
+        self.misses += 1
+        with Image.open(path) as img:           # reads the header only
+            width, height = img.size
+        texture = GL.glGenTextures(1)
+        nbytes = _allocate(texture, width, height, mode, mipmap, wrap) if mipmap \
+            else _storage_bytes(width, height, mode, mipmap)
+        self._insert(key, texture, nbytes)
+        _placeholder(texture, width, height, mode, mipmap, wrap)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='texture')
+        self._pending.add(texture)
+        self._executor.submit(self._decode_job, texture, path, flip, mode, mipmap, wrap)
+        return texture
+
+    def _decode_job(self, texture, path, flip, mode, mipmap, wrap):
+        # worker thread: no GL calls here, the upload happens on the render thread
+        try:
+            levels = self._levels(path, flip, mode, mipmap)
+        except Exception as e:
+            print('[texture] failed to decode %s: %s' % (path, e))
+            levels = None
+        self._decoded.put((texture, levels, (mode, mipmap, wrap)))
+
+    def _levels(self, path, flip, mode, mipmap):
+        """ [level 0] decoded, or the baked mip chain ([level 0] only without mipmap) """
+        if not self.bake:
+            return [baked_texture.decode(path, flip, mode)]
+        levels = baked_texture.load(path, flip, mode)
+        return levels if mipmap else levels[:1]
+
+    def process_uploads(self, budget=None):
+        """ upload decoded images, at most 'budget' bytes (default upload_budget)
+            but always one, so a large image cannot starve; returns the count """
+        self._poll_fences()
+        budget = self.upload_budget if budget is None else budget
+        uploaded, nbytes = 0, 0
+        while nbytes < budget or uploaded == 0:
+            try:
+                texture, levels, (mode, mipmap, wrap) = self._decoded.get_nowait()
+            except queue.Empty:
+                break
+            key = self.keys.get(texture)
+            if key is None or levels is None:   # evicted meanwhile, or undecodable
+                self._pending.discard(texture)
+                continue
+            size = sum(level.nbytes for level in levels)
+            if not mipmap:                      # replaces the 1x1 placeholder (see _placeholder)
+                _allocate(texture, levels[0].shape[1], levels[0].shape[0], mode, mipmap, wrap)
+            if self.pbo:
+                pbo, capacity = self._pbo(size)
+                _upload(texture, levels, mode, mipmap, pbo)
+                self._in_flight.append([texture, pbo, capacity, GL.glFenceSync(GL.GL_SYNC_GPU_COMMANDS_COMPLETE, 0)])
+            else:
+                _upload(texture, levels, mode, mipmap)
+                self._pending.discard(texture)
+            uploaded += 1
+            nbytes += size
+        if uploaded:
+            self.evict()
+        return uploaded
+
+    def _pbo(self, nbytes):
+        """ (pixel unpack buffer, its size) of at least nbytes, recycled when possible """
+        for i, (pbo, size) in enumerate(self._free_pbos):
+            if size >= nbytes:
+                del self._free_pbos[i]
+                return pbo, size
+        pbo = GL.glGenBuffers(1)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, pbo)
+        GL.glBufferData(GL.GL_PIXEL_UNPACK_BUFFER, nbytes, None, GL.GL_STREAM_DRAW)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+        return pbo, nbytes
+
+    def _poll_fences(self):
+        """ textures whose transfer is done become resident, their PBO goes
+            back to the pool; never waits """
+        still = []
+        for texture, pbo, nbytes, fence in self._in_flight:
+            status = GL.glClientWaitSync(fence, 0, 0)
+            if status not in (GL.GL_ALREADY_SIGNALED, GL.GL_CONDITION_SATISFIED):
+                still.append([texture, pbo, nbytes, fence])
+                continue
+            GL.glDeleteSync(fence)
+            self._free_pbos.append((pbo, nbytes))
+            self._pending.discard(texture)
+        self._in_flight = still
+        # one spare buffer is enough to recycle, keep the largest
+        self._free_pbos.sort(key=lambda entry: -entry[1])
+        for pbo, _ in self._free_pbos[1:]:
+            GL.glDeleteBuffers(1, [pbo])
+        del self._free_pbos[1:]
+
+    @property
+    def pending(self):
+        """ count of textures still decoding or in transfer """
+        return len(self._pending)
+
+    def resident(self, texture):
+        """ True once the texture's pixels are on the GPU (its fence signaled) """
+        return texture in self.keys and texture not in self._pending
+
+    def _hit(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.hits += 1
+        entry[2] += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def _insert(self, key, texture, nbytes):
+        self.entries[key] = [texture, nbytes, 1]
+        self.keys[texture] = key
+        self.used += nbytes
+        self.evict()
+
+    def release(self, texture):
+        """ drop a reference taken by load(), the texture stays cached until evicted """
+        key = self.keys.get(texture)
+        if key is not None:
+            self.entries[key][2] = max(0, self.entries[key][2] - 1)
+
+    def evict(self, budget=None):
+        """ delete unreferenced textures, least recently used first, until under budget """
+        budget = self.budget if budget is None else budget
+        for key in list(self.entries):
+            if self.used <= budget:
+                break
+            texture, nbytes, refs = self.entries[key]
+            if refs == 0:
+                self._delete(key)
+                self.evictions += 1
+
+    def _delete(self, key):
+        texture, nbytes, _ = self.entries.pop(key)
+        del self.keys[texture]
+        self._pending.discard(texture)
+        self.used -= nbytes
+        gl_state.forget_texture(texture)
+        GL.glDeleteTextures(1, [texture])
+
+    def clear(self):
+        """ delete every texture, referenced or not (e.g. before the context goes away) """
+        for key in list(self.entries):
+            self._delete(key)
+        for _, pbo, _, fence in self._in_flight:
+            GL.glDeleteSync(fence)
+            GL.glDeleteBuffers(1, [pbo])
+        for pbo, _ in self._free_pbos:
+            GL.glDeleteBuffers(1, [pbo])
+        self._pending.clear()
+        self._in_flight, self._free_pbos = [], []
+
+    def report(self):
+        return ('texture cache: %d hits, %d misses, %d evictions, %d pending, %d textures, %.1f / %.1f MB'
+                % (self.hits, self.misses, self.evictions, self.pending, len(self.entries),
+                   self.used / 2**20, self.budget / 2**20))
+
+
+def mip_count(width, height):
+    """ levels of a full mip chain down to 1x1 """
+    return int(math.log2(max(width, height))) + 1
+
+
+def _alignment(row_bytes):
+    """ largest GL_UNPACK_ALIGNMENT a tightly packed row satisfies """
+    for alignment in (8, 4, 2):
+        if row_bytes % alignment == 0:
+            return alignment
+    return 1
+
+
+_storage = None
+
+
+def texture_storage():
+    """ True if glTexStorage2D (GL 4.2 / ARB_texture_storage) is available """
+    global _storage
+    if _storage is None:
+        _storage = bool(GL.glTexStorage2D)
+    return _storage
+
+
+def _allocate(texture, width, height, mode, mipmap, wrap):
+    """ storage for level 0 (and the mip chain), immutable where supported;
+        returns its size in GPU bytes """
+    internal, pixel_format = _FORMATS[mode]
+    levels = mip_count(width, height) if mipmap else 1
+    gl_state.bind_texture(texture)
+    if texture_storage():
+        GL.glTexStorage2D(GL.GL_TEXTURE_2D, levels, internal, width, height)
+    else:
+        for level in range(levels):
+            GL.glTexImage2D(GL.GL_TEXTURE_2D, level, internal, max(1, width >> level),
+                            max(1, height >> level), 0, pixel_format, GL.GL_UNSIGNED_BYTE, None)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, levels - 1)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, wrap)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, wrap)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER,
+                       GL.GL_LINEAR_MIPMAP_LINEAR if mipmap else GL.GL_LINEAR)
+    return _storage_bytes(width, height, mode, mipmap)
+
+
+def _storage_bytes(width, height, mode, mipmap):
+    levels = mip_count(width, height) if mipmap else 1
+    return sum(max(1, width >> l) * max(1, height >> l) for l in range(levels)) * len(mode)
+
+
+def _placeholder(texture, width, height, mode, mipmap, wrap):
+    """ gray until the image is uploaded: a mipmapped texture samples its
+        1x1 top level alone (base level); another gets a mutable 1x1 level 0,
+        which _allocate may still replace by immutable storage """
+    gray = np.full((1, 1, len(mode)), 128, dtype=np.uint8)
+    if mipmap:
+        top = mip_count(width, height) - 1
+        _write(texture, top, gray, mode)
+        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BASE_LEVEL, top)
+        return
+    internal, pixel_format = _FORMATS[mode]
+    gl_state.bind_texture(texture)
+    GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 1)
+    GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, internal, 1, 1, 0, pixel_format, GL.GL_UNSIGNED_BYTE, gray)
+    GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAX_LEVEL, 0)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, wrap)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, wrap)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR)
+
+
+def _write(texture, level, pixels, mode, source=None):
+    """ upload one level straight from a C-contiguous array (or memmap view), no copy
+
+    source: byte offset of the level in the bound pixel unpack buffer, the
+            pixels then only give the size
+    """
+    pixels = np.ascontiguousarray(pixels, dtype=np.uint8)     # no-op for decoded / baked pixels
+    height, width = pixels.shape[:2]
+    gl_state.bind_texture(texture)
+    GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, _alignment(width * len(mode)))
+    GL.glTexSubImage2D(GL.GL_TEXTURE_2D, level, 0, 0, width, height, _FORMATS[mode][1], GL.GL_UNSIGNED_BYTE,
+                       pixels if source is None else ctypes.c_void_p(source))
+    GL.glPixelStorei(GL.GL_UNPACK_ALIGNMENT, 4)                # back to the GL default
+
+
+def _fill_pbo(pbo, levels):
+    """ copy the levels back to back into pbo, returns their offsets """
+    nbytes = sum(level.nbytes for level in levels)
+    GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, pbo)
+    # orphan the previous contents: no wait if the GPU still reads them
+    ptr = GL.glMapBufferRange(GL.GL_PIXEL_UNPACK_BUFFER, 0, nbytes,
+                              GL.GL_MAP_WRITE_BIT | GL.GL_MAP_INVALIDATE_BUFFER_BIT)
+    ptr = ctypes.cast(ptr, ctypes.c_void_p).value     # PyOpenGL returns an int or a c_void_p
+    offsets, offset = [], 0
+    for level in levels:
+        level = np.ascontiguousarray(level, dtype=np.uint8)
+        ctypes.memmove(ptr + offset, level.ctypes.data, level.nbytes)
+        offsets.append(offset)
+        offset += level.nbytes
+    GL.glUnmapBuffer(GL.GL_PIXEL_UNPACK_BUFFER)
+    return offsets
+
+
+def _upload(texture, levels, mode, mipmap, pbo=None):
+    """ fill allocated storage from [level 0, level 1, ...]
+
+    A single level with mipmap on gets its chain from glGenerateMipmap,
+    a full (pre-baked) chain is uploaded as is.
+    pbo: stage the pixels in this buffer, glTexSubImage2D then returns
+         without reading client memory
+    """
+    if pbo is None:
+        for level, pixels in enumerate(levels):
+            _write(texture, level, pixels, mode)
+    else:
+        offsets = _fill_pbo(pbo, levels)
+        for level, (pixels, offset) in enumerate(zip(levels, offsets)):
+            _write(texture, level, pixels, mode, offset)
+        GL.glBindBuffer(GL.GL_PIXEL_UNPACK_BUFFER, 0)
+    GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_BASE_LEVEL, 0)
+    if mipmap and len(levels) == 1:
+        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
+
+
+# process wide cache, there is a single context per viewer -------------------
+BUDGET_ENV = 'TOSTUDENTS_TEXTURE_BUDGET_MB'
+BAKE_ENV = 'TOSTUDENTS_TEXTURE_BAKE'           # '0' decodes every launch instead
+_default_cache = None
+
+
+def default_cache():
+    """ The shared TextureCache, budget from TOSTUDENTS_TEXTURE_BUDGET_MB (default 256),
+        baking unless TOSTUDENTS_TEXTURE_BAKE=0 """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TextureCache(int(float(os.environ.get(BUDGET_ENV, 256)) * 2**20),
+                                      bake=os.environ.get(BAKE_ENV, '1') != '0')
+    return _default_cache
+
+
+def load(path, **options):
+    """ texture id for path from the shared cache, see TextureCache.load """
+    return default_cache().load(path, **options)
+
+
+def load_async(path, **options):
+    """ texture id for path, decoded in the background, see TextureCache.load_async """
+    return default_cache().load_async(path, **options)
+
+
+def process_uploads(budget=None):
+    """ per-frame upload of decoded images, call from the render loop """
+    if _default_cache is None:
+        return 0
+    return _default_cache.process_uploads(budget)
+
+
+def release(texture):
+    if _default_cache is not None:
+        _default_cache.release(texture)
+
+
+def resident(texture):
+    """ True once the texture's pixels are uploaded, see TextureCache.resident """
+    return _default_cache is not None and _default_cache.resident(texture)
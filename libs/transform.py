@@ -20,7 +20,7 @@ def vec(*iterable):
 
 def normalized(vector):
     """ normalized version of any vector, with zero division check """
-    norm = math.sqrt(sum(vector*vector))
+    norm = math.sqrt(np.dot(vector, vector))
     return vector / norm if norm > 0. else vector
 
 
@@ -30,34 +30,50 @@ def lerp(point_a, point_b, fraction):
 
 
 # Typical 4x4 matrix utilities for OpenGL ------------------------------------
-def identity():
+# All return float32 matrices, as uploaded; with 'out' (a float32 4x4) they
+# write into it and return it instead of allocating.
+_IDENTITY = np.identity(4, 'f')
+
+
+def _matrix(rows, out):
+    """ float32 4x4 of rows, in out if given """
+    if out is None:
+        return np.array(rows, 'f')
+    out[...] = rows
+    return out
+
+
+def identity(out=None):
     """ 4x4 identity matrix """
-    return np.identity(4, 'f')
+    if out is None:
+        return np.identity(4, 'f')
+    out[...] = _IDENTITY
+    return out
 
 
-def ortho(left, right, bot, top, near, far):
+def ortho(left, right, bot, top, near, far, out=None):
     """ orthogonal projection matrix for OpenGL """
     dx, dy, dz = right - left, top - bot, far - near
     rx, ry, rz = -(right+left) / dx, -(top+bot) / dy, -(far+near) / dz
-    return np.array([[2/dx, 0,    0,     rx],
-                     [0,    2/dy, 0,     ry],
-                     [0,    0,    -2/dz, rz],
-                     [0,    0,    0,     1]], 'f')
+    return _matrix([[2/dx, 0,    0,     rx],
+                    [0,    2/dy, 0,     ry],
+                    [0,    0,    -2/dz, rz],
+                    [0,    0,    0,     1]], out)
 
 
-def perspective(fovy, aspect, near, far):
+def perspective(fovy, aspect, near, far, out=None):
     """ perspective projection matrix, from field of view and aspect ratio """
     _scale = 1.0/math.tan(math.radians(fovy)/2.0)
     sx, sy = _scale / aspect, _scale
     zz = (far + near) / (near - far)
     zw = 2 * far * near/(near - far)
-    return np.array([[sx, 0,  0,  0],
-                     [0,  sy, 0,  0],
-                     [0,  0, zz, zw],
-                     [0,  0, -1,  0]], 'f')
+    return _matrix([[sx, 0,  0,  0],
+                    [0,  sy, 0,  0],
+                    [0,  0, zz, zw],
+                    [0,  0, -1,  0]], out)
 
 
-def frustum(xmin, xmax, ymin, ymax, zmin, zmax):
+def frustum(xmin, xmax, ymin, ymax, zmin, zmax, out=None):
     """ frustum projection matrix for OpenGL, from min and max coordinates"""
     a = (xmax+xmin) / (xmax-xmin)
     b = (ymax+ymin) / (ymax-ymin)
@@ -65,24 +81,59 @@ def frustum(xmin, xmax, ymin, ymax, zmin, zmax):
     d = -2*zmax*zmin / (zmax-zmin)
     sx = 2*zmin / (xmax-xmin)
     sy = 2*zmin / (ymax-ymin)
-    return np.array([[sx, 0,  a, 0],
-                     [0, sy,  b, 0],
-                     [0,  0,  c, d],
-                     [0,  0, -1, 0]], 'f')
+    return _matrix([[sx, 0,  a, 0],
+                    [0, sy,  b, 0],
+                    [0,  0,  c, d],
+                    [0,  0, -1, 0]], out)
 
 
-def translate(x=0.0, y=0.0, z=0.0):
+def translate(x=0.0, y=0.0, z=0.0, out=None):
     """ matrix to translate from coordinates (x,y,z) or a vector x"""
-    matrix = np.identity(4, 'f')
-    matrix[:3, 3] = vec(x, y, z) if isinstance(x, Number) else vec(x)
+    matrix = identity(out)
+    matrix[:3, 3] = (x, y, z) if isinstance(x, Number) else x[:3]
     return matrix
 
 
-def scale(x, y=None, z=None):
+def scale(x, y=None, z=None, out=None):
     """scale matrix, with uniform (x alone) or per-dimension (x,y,z) factors"""
     x, y, z = (x, y, z) if isinstance(x, Number) else (x[0], x[1], x[2])
     y, z = (x, x) if y is None or z is None else (y, z)  # uniform scaling
-    return np.diag((x, y, z, 1))
+    return _matrix([[x, 0, 0, 0],
+                    [0, y, 0, 0],
+                    [0, 0, z, 0],
+                    [0, 0, 0, 1]], out)
+
+
+def trs_euler(translation=(0., 0., 0.), degrees=(0., 0., 0.), factors=(1., 1., 1.), out=None):
+    """ translate(translation) @ rotate x @ rotate y @ rotate z (degrees) @
+        scale(factors), in closed form, written into 'out' (4x4 float32) if
+        given: no intermediate matrices """
+    sa, ca = sincos(degrees[0])
+    sb, cb = sincos(degrees[1])
+    sc, cc = sincos(degrees[2])
+    sx, sy, sz = factors
+    out = np.empty((4, 4), 'f') if out is None else out
+    out[...] = ((cb*cc*sx,                -cb*sc*sy,                sb*sz,     translation[0]),
+                ((ca*sc + sa*sb*cc)*sx,   (ca*cc - sa*sb*sc)*sy,   -sa*cb*sz,  translation[1]),
+                ((sa*sc - ca*sb*cc)*sx,   (sa*cc + ca*sb*sc)*sy,   ca*cb*sz,   translation[2]),
+                (0,                       0,                       0,          1))
+    return out
+
+
+class ModelMatrix:
+    """ trs_euler() of UI values, recomputed only when they change """
+
+    def __init__(self):
+        self.matrix = identity()
+        self._key = (0., 0., 0., 0., 0., 0., 1., 1., 1.)
+
+    def update(self, translation, degrees, factors):
+        """ the model matrix; the same array, rebuilt in place when a value moved """
+        key = (*translation, *degrees, *factors)
+        if key != self._key:
+            trs_euler(translation, degrees, factors, out=self.matrix)
+            self._key = key
+        return self.matrix
 
 
 def sincos(degrees=0.0, radians=None):
@@ -91,27 +142,116 @@ def sincos(degrees=0.0, radians=None):
     return math.sin(radians), math.cos(radians)
 
 
-def rotate(axis=(1., 0., 0.), angle=0.0, radians=None):
+def rotate(axis=(1., 0., 0.), angle=0.0, radians=None, out=None):
     """ 4x4 rotation matrix around 'axis' with 'angle' degrees or 'radians' """
-    x, y, z = normalized(vec(axis))
+    x, y, z = normalized(vec(axis)).tolist()
     s, c = sincos(angle, radians)
     nc = 1 - c
-    return np.array([[x*x*nc + c,   x*y*nc - z*s, x*z*nc + y*s, 0],
-                     [y*x*nc + z*s, y*y*nc + c,   y*z*nc - x*s, 0],
-                     [x*z*nc - y*s, y*z*nc + x*s, z*z*nc + c,   0],
-                     [0,            0,            0,            1]], 'f')
+    return _matrix([[x*x*nc + c,   x*y*nc - z*s, x*z*nc + y*s, 0],
+                    [y*x*nc + z*s, y*y*nc + c,   y*z*nc - x*s, 0],
+                    [x*z*nc - y*s, y*z*nc + x*s, z*z*nc + c,   0],
+                    [0,            0,            0,            1]], out)
 
 
-def lookat(eye, target, up):
+def lookat(eye, target, up, out=None):
     """ Computes 4x4 view matrix from 3d point 'eye' to 'target',
         'up' 3d vector fixes orientation """
-    view = normalized(vec(target)[:3] - vec(eye)[:3])
+    eye = vec(eye)[:3]
+    view = normalized(vec(target)[:3] - eye)
     up = normalized(vec(up)[:3])
     right = np.cross(view, up)
     up = np.cross(right, view)
-    rotation = np.identity(4)
-    rotation[:3, :3] = np.vstack([right, up, -view])
-    return rotation @ translate(-eye)
+    # rotation @ translate(-eye): the rows are the axes, the translation -axis.eye
+    matrix = identity(out)
+    matrix[0, :3], matrix[1, :3], matrix[2, :3] = right, up, -view
+    matrix[:3, 3] = -(matrix[:3, :3] @ eye)
+    return matrix
+
+
+# Batched 4x4 matrices, one per object of an (N, ...) array ------------------
+def _identities(count):
+    """ (count, 4, 4) float32 identity matrices """
+    matrices = np.zeros((count, 4, 4), 'f')
+    matrices[:, [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    return matrices
+
+
+def _scales(factors, count):
+    """ (count, 3) per-axis factors from (N,) uniform or (N, 3) factors """
+    factors = np.asarray(factors, 'f')
+    return np.broadcast_to(factors[:, None] if factors.ndim == 1 else factors, (count, 3))
+
+
+def batch_translate(translations):
+    """ (N, 4, 4) translation matrices from (N, 3) offsets """
+    translations = np.asarray(translations, 'f').reshape(-1, 3)
+    matrices = _identities(len(translations))
+    matrices[:, :3, 3] = translations
+    return matrices
+
+
+def batch_scale(factors):
+    """ (N, 4, 4) scale matrices from (N,) uniform or (N, 3) factors """
+    factors = np.asarray(factors, 'f')
+    matrices = _identities(len(factors))
+    matrices[:, [0, 1, 2], [0, 1, 2]] = _scales(factors, len(factors))
+    return matrices
+
+
+def _rotations(quaternions):
+    """ (N, 3, 3) rotations of (N, 4) quaternions (w, x, y, z), normalized first """
+    q = np.asarray(quaternions, 'f').reshape(-1, 4)
+    norm = np.sqrt(np.einsum('ij,ij->i', q, q))[:, None]
+    q = np.divide(q, norm, out=np.zeros_like(q), where=norm > 0)
+    w, x, y, z = q.T
+    return np.stack([1 - 2*(y*y + z*z), 2*(x*y - w*z),     2*(x*z + w*y),
+                     2*(x*y + w*z),     1 - 2*(x*x + z*z), 2*(y*z - w*x),
+                     2*(x*z - w*y),     2*(y*z + w*x),     1 - 2*(x*x + y*y)], axis=1).reshape(-1, 3, 3)
+
+
+def batch_quaternion_matrix(quaternions):
+    """ (N, 4, 4) rotation matrices from (N, 4) quaternions (w, x, y, z) """
+    rotations = _rotations(quaternions)
+    matrices = _identities(len(rotations))
+    matrices[:, :3, :3] = rotations
+    return matrices
+
+
+def batch_quaternion_from_axis_angle(axes, degrees=None, radians=None):
+    """ (N, 4) quaternions from (N, 3) axes and (N,) angles in degrees or radians """
+    axes = np.asarray(axes, 'f').reshape(-1, 3)
+    half = 0.5 * (np.asarray(radians, 'f') if radians is not None else np.radians(np.asarray(degrees, 'f')))
+    norm = np.sqrt(np.einsum('ij,ij->i', axes, axes))[:, None]
+    axes = np.divide(axes, norm, out=np.zeros_like(axes), where=norm > 0)
+    return np.concatenate([np.cos(half)[:, None], axes * np.sin(half)[:, None]], axis=1).astype('f')
+
+
+def batch_rotate(axes, degrees=None, radians=None):
+    """ (N, 4, 4) rotation matrices around (N, 3) axes by (N,) angles """
+    return batch_quaternion_matrix(batch_quaternion_from_axis_angle(axes, degrees, radians))
+
+
+def batch_trs(translations=None, rotations=None, scales=None):
+    """ (N, 4, 4) translate @ rotate @ scale of each object, in one pass
+
+    translations: (N, 3); rotations: (N, 4) quaternions (w, x, y, z) or
+    (N, 3, 3) / (N, 4, 4) matrices; scales: (N,) uniform or (N, 3). Omitted
+    parts are identities, N comes from the first one given. The result is
+    row-major like the single-object helpers, ready for an instance buffer
+    (transpose for a column-major attribute).
+    """
+    parts = [np.asarray(part) for part in (translations, rotations, scales) if part is not None]
+    count = len(parts[0]) if parts else 0
+    matrices = _identities(count)
+    if rotations is not None:
+        rotations = np.asarray(rotations, 'f')
+        matrices[:, :3, :3] = rotations[:, :3, :3] if rotations.ndim == 3 else _rotations(rotations)
+    if scales is not None:
+        # R @ S scales the columns of R
+        matrices[:, :3, :3] *= _scales(scales, count)[:, None, :]
+    if translations is not None:
+        matrices[:, :3, 3] = np.asarray(translations, 'f').reshape(-1, 3)
+    return matrices
 
 
 # quaternion functions -------------------------------------------------------
@@ -136,24 +276,28 @@ def quaternion_from_euler(yaw=0.0, pitch=0.0, roll=0.0, radians=None):
                       z=siy*cor*cop - coy*sir*sip, w=coy*cor*cop + siy*sir*sip)
 
 
-def quaternion_mul(q1, q2):
+def quaternion_mul(q1, q2, out=None):
     """ Compute quaternion which composes rotations of two quaternions """
-    return np.dot(np.array([[q1[0], -q1[1], -q1[2], -q1[3]],
-                            [q1[1],  q1[0], -q1[3],  q1[2]],
-                            [q1[2],  q1[3],  q1[0], -q1[1]],
-                            [q1[3], -q1[2],  q1[1],  q1[0]]]), q2)
+    w1, x1, y1, z1 = q1
+    w2, x2, y2, z2 = q2
+    product = (w1*w2 - x1*x2 - y1*y2 - z1*z2, x1*w2 + w1*x2 - z1*y2 + y1*z2,
+               y1*w2 + z1*x2 + w1*y2 - x1*z2, z1*w2 - y1*x2 + x1*y2 + w1*z2)
+    if out is None:
+        return np.array(product, 'f')
+    out[...] = product
+    return out
 
 
-def quaternion_matrix(q):
+def quaternion_matrix(q, out=None):
     """ Create 4x4 rotation matrix from quaternion q """
-    q = normalized(q)  # only unit quaternions are valid rotations.
-    nxx, nyy, nzz = -q[1]*q[1], -q[2]*q[2], -q[3]*q[3]
-    qwx, qwy, qwz = q[0]*q[1], q[0]*q[2], q[0]*q[3]
-    qxy, qxz, qyz = q[1]*q[2], q[1]*q[3], q[2]*q[3]
-    return np.array([[2*(nyy + nzz)+1, 2*(qxy - qwz),   2*(qxz + qwy),   0],
-                     [2 * (qxy + qwz), 2 * (nxx + nzz) + 1, 2 * (qyz - qwx), 0],
-                     [2 * (qxz - qwy), 2 * (qyz + qwx), 2 * (nxx + nyy) + 1, 0],
-                     [0, 0, 0, 1]], 'f')
+    w, x, y, z = normalized(np.asarray(q, 'f')).tolist()  # only unit quaternions are valid rotations.
+    nxx, nyy, nzz = -x*x, -y*y, -z*z
+    qwx, qwy, qwz = w*x, w*y, w*z
+    qxy, qxz, qyz = x*y, x*z, y*z
+    return _matrix([[2*(nyy + nzz)+1, 2*(qxy - qwz),   2*(qxz + qwy),   0],
+                    [2 * (qxy + qwz), 2 * (nxx + nzz) + 1, 2 * (qyz - qwx), 0],
+                    [2 * (qxz - qwy), 2 * (qyz + qwx), 2 * (nxx + nyy) + 1, 0],
+                    [0, 0, 0, 1]], out)
 
 
 def quaternion_slerp(q0, q1, fraction):
@@ -211,7 +355,7 @@ class Trackball:
 
     def _project3d(self, position2d, radius=0.8):
         """ Project x,y on sphere OR hyperbolic sheet if away from center """
-        p2, r2 = sum(position2d*position2d), radius*radius
+        p2, r2 = float(np.dot(position2d, position2d)), radius*radius
         zcoord = math.sqrt(r2 - p2) if 2*p2 < r2 else r2 / (2*math.sqrt(p2))
         return vec(*position2d, zcoord)
 
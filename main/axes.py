@@ -2,6 +2,7 @@ from tostudents.libs.shader import *
 from tostudents.libs.buffer import *
 import numpy as np
 from OpenGL import GL
+from tostudents.libs import gl_state
 
 class Axes(object):
     def __init__(self, vert_shader, frag_shader, length=2.0):
@@ -50,7 +51,7 @@ class Axes(object):
         
         # Shader & VAO
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)
 
@@ -63,17 +64,16 @@ class Axes(object):
 
     def draw(self, projection, view, model):
         """Vẽ hệ trục"""
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         
         # Vẽ các đường thẳng (không dùng glLineWidth vì không support trên macOS Core Profile)
         GL.glDrawElements(GL.GL_LINES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+OBJ parse time: the former line-by-line ObjLoader.load versus obj_parser.
+
+    python -m tostudents.main.bench_obj [--faces N ...] [--skip-legacy] [--workers N] [model.obj ...]
+
+Without model files, grid models of 10k, 100k and 1M triangles (v, vt and
+v/vt/vn faces) are generated in a temporary folder. Both parsers must give
+the same expanded vertices; the legacy one is slow at 1M faces (skip it with
+--skip-legacy). --workers N parses with obj_parser.load_parallel, the
+default is the single process parser whatever the file size.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from tostudents.object3d import obj_parser
+
+FACES = (10_000, 100_000, 1_000_000)
+
+
+def write_grid(path, faces):
+    """ a wavy (n x n) grid of 2 * n * n >= faces triangles, with vt and vn """
+    n = int(np.ceil(np.sqrt(faces / 2)))
+    u, v = np.meshgrid(np.linspace(0, 1, n + 1), np.linspace(0, 1, n + 1))
+    u, v = u.ravel(), v.ravel()
+    pos = np.stack([u * 10, np.sin(u * 20) * np.cos(v * 20), v * 10], axis=1)
+    i = (np.arange(n)[:, None] * (n + 1) + np.arange(n)).ravel() + 1
+    tris = np.concatenate([np.stack([i, i + n + 1, i + 1], 1), np.stack([i + 1, i + n + 1, i + n + 2], 1)])
+    with open(path, 'w') as f:
+        f.write('# grid %dx%d\n' % (n, n))
+        np.savetxt(f, pos, fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, np.stack([u, v], 1), fmt='vt %.6f %.6f')
+        f.write('vn 0 1 0\n')
+        corners = np.repeat(tris, 3, axis=1).reshape(-1, 9)
+        corners[:, 2::3] = 1
+        np.savetxt(f, corners, fmt='f %d/%d/%d %d/%d/%d %d/%d/%d')
+    return len(tris)
+
+
+def legacy_load(path):
+    """ ObjLoader.load before obj_parser, returns (vertices, texcoords) """
+    vert_coords, text_coords, vertex_index, texture_index = [], [], [], []
+    for line in open(path, 'r'):
+        if line.startswith('#'):
+            continue
+        values = line.strip().split()
+        if not values:
+            continue
+        if values[0] == 'v':
+            vert_coords.append([float(v) for v in values[1:4]])
+        elif values[0] == 'vt':
+            text_coords.append([float(v) for v in values[1:3]])
+        elif values[0] == 'f':
+            face_i, text_i = [], []
+            for v in values[1:4]:
+                w = v.split('/')
+                face_i.append(int(w[0]) - 1)
+                if len(w) >= 2 and w[1] != '':
+                    text_i.append(int(w[1]) - 1)
+            vertex_index.append(face_i)
+            texture_index.append(text_i)
+    vertex_index = [y for x in vertex_index for y in x]
+    texture_index = [y for x in texture_index for y in x]
+    vertices, texcoords = [], []
+    for i in vertex_index:
+        vertices.extend(vert_coords[i])
+    for i in texture_index:
+        texcoords.extend(text_coords[i])
+    return np.array(vertices, dtype='float32'), np.array(texcoords, dtype='float32')
+
+
+def bulk_load(path, workers=1):
+    """ obj_parser + the expansion ObjLoader.load used to do """
+    obj = obj_parser.load(path, workers)
+    corners = obj.corners[obj.face_starts[:, None] + np.arange(3)].reshape(-1, 3)
+    return obj.positions[corners[:, 0]], obj.texcoords[corners[:, 1][corners[:, 1] >= 0]]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('models', nargs='*')
+    parser.add_argument('--faces', type=int, nargs='+', default=FACES)
+    parser.add_argument('--skip-legacy', action='store_true')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    models = args.models
+    if not models:
+        folder = tempfile.mkdtemp(prefix='bench_obj_')
+        models = []
+        for faces in args.faces:
+            path = os.path.join(folder, 'grid_%d.obj' % faces)
+            write_grid(path, faces)
+            models.append(path)
+
+    print('%-20s %9s %9s %11s %11s %8s' % ('model', 'faces', 'MB', 'legacy ms', 'bulk ms', 'speedup'))
+    for path in models:
+        bulk, (vertices, texcoords) = timed(bulk_load, path, args.workers)
+        legacy = None
+        if not args.skip_legacy:
+            legacy, (ref_vertices, ref_texcoords) = timed(legacy_load, path)
+            assert np.array_equal(ref_vertices.reshape(-1, 3), vertices), 'vertices differ'
+            assert np.array_equal(ref_texcoords.reshape(-1, 2), texcoords), 'texcoords differ'
+        print('%-20s %9d %9.1f %11s %11.1f %8s' % (
+            os.path.basename(path), len(vertices) // 3, os.path.getsize(path) / 2**20,
+            '-' if legacy is None else '%.1f' % (legacy * 1e3), bulk * 1e3,
+            '-' if legacy is None else '%.1fx' % (legacy / bulk)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold versus warm startup of every viewer with the program binary cache.
+
+    python -m tostudents.main.bench_startup [cache_dir]
+
+Each viewer is constructed twice in a hidden window: once with an emptied
+cache (every program compiled from source and stored) and once with the
+cache filled by the first run (programs reloaded with glProgramBinary).
+The driver's own shader cache is disabled for Mesa so the cold run is cold.
+"""
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('MESA_SHADER_CACHE_DISABLE', 'true')
+
+import glfw
+
+from tostudents.libs import program_cache
+from tostudents.libs import shader
+from tostudents.libs import gl_state
+
+VIEWERS = [
+    ('2d', 'tostudents.assignment1_1.2d.viewer', 'Viewer'),
+    ('shape3d', 'tostudents.assignment1_1.shape3d.viewer', 'Viewer'),
+    ('texture', 'tostudents.assignment1_1.shape3d.viewer_texture', 'Viewer'),
+    ('equation', 'tostudents.assignment1_1.shape3d.viewer_equation', 'ViewerEquation'),
+    ('atom', 'tostudents.atom.viewer', 'Viewer'),
+]
+
+
+def _close(viewer):
+    shader.clear_variants()     # shared programs belong to this context, the next viewer builds its own
+    gl_state.invalidate()
+    impl = getattr(viewer, 'impl', None)
+    if impl is not None:
+        import imgui
+        impl.shutdown()
+        imgui.destroy_context()
+    glfw.destroy_window(viewer.win)
+
+
+def time_viewer(viewer_class):
+    glfw.window_hint(glfw.VISIBLE, False)
+    start = time.perf_counter()
+    viewer = viewer_class()
+    shader.finish_all()     # builds are deferred to first use, wait for them
+    elapsed = time.perf_counter() - start
+    _close(viewer)
+    return elapsed
+
+
+def main(cache_dir=None):
+    if not glfw.init():
+        raise RuntimeError("Failed to initialize GLFW")
+    cache = program_cache.enable(cache_dir or tempfile.mkdtemp(prefix='program_cache_'))
+
+    print('%-10s %10s %10s %8s' % ('viewer', 'cold (ms)', 'warm (ms)', 'speedup'))
+    for name, module_name, class_name in VIEWERS:
+        try:
+            viewer_class = getattr(importlib.import_module(module_name), class_name)
+            cache.clear()
+            cold = time_viewer(viewer_class)
+            warm = time_viewer(viewer_class)
+        except Exception as e:
+            print('%-10s failed: %s' % (name, e))
+            continue
+        print('%-10s %10.1f %10.1f %7.2fx' % (name, cold * 1e3, warm * 1e3, cold / warm))
+
+    print(cache.report())
+    glfw.terminate()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,140 @@
+"""
+Texture load time: PIL / cv2 decoding versus pre-baked memory-mapped files.
+
+    python -m tostudents.main.bench_textures [image ...]
+
+Without arguments an 8K (8192x4096) equirectangular-like image is generated
+as JPEG and PNG in a temporary folder. For each image this times, best of
+'repeat' runs:
+
+    pil      Image.open + convert + np.asarray (TextureCache without baking)
+    cv2      cv2.imread + cvtColor (UManager.load_texture path)
+    bake     one-off decode + mip chain + write of the baked file
+    mmap     baked_texture.load of the up to date baked file (stamp check
+             and mapping), every page of every mip level touched (the file
+             was just written, so this is the warm page cache case)
+
+and, if a GL context can be created, the upload itself into immutable storage:
+the decoded image plus glGenerateMipmap versus the baked chain level by level.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from tostudents.libs import baked_texture
+
+REPEAT = 3
+PAGE = 4096
+
+
+def best_of(fn, repeat=REPEAT):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def make_images(folder, width=8192, height=4096):
+    """ smooth color bands plus noise, so JPEG/PNG sizes are realistic """
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    rng = np.random.default_rng(0)
+    rgb = np.stack([np.sin(x / 700.0), np.cos(y / 500.0), np.sin((x + y) / 900.0)], axis=-1)
+    rgb = (rgb * 100 + 128 + rng.normal(0, 12, rgb.shape)).clip(0, 255).astype(np.uint8)
+    paths = []
+    for ext in ('jpg', 'png'):
+        path = os.path.join(folder, '8k.%s' % ext)
+        Image.fromarray(rgb).save(path)
+        paths.append(path)
+    return paths
+
+
+def touch(levels):
+    """ fault in every page of the mapping, as an upload would """
+    return sum(int(level.reshape(-1)[::PAGE].sum()) for level in levels)
+
+
+def cpu_times(path, mode='RGBA'):
+    times = {'pil': best_of(lambda: baked_texture.decode(path, False, mode))}
+    try:
+        import cv2
+        code = cv2.COLOR_BGR2RGBA if mode == 'RGBA' else cv2.COLOR_BGR2RGB
+        times['cv2'] = best_of(lambda: cv2.cvtColor(cv2.imread(path, 1), code))
+    except ImportError:
+        pass
+    times['bake'] = best_of(lambda: baked_texture.bake(path, False, mode, force=True), repeat=1)
+    times['mmap'] = best_of(lambda: touch(baked_texture.load(path, False, mode)))
+    return times
+
+
+def gl_times(path, mode='RGBA'):
+    """ upload timings in a hidden window, None if no context can be made """
+    try:
+        import glfw
+        import OpenGL.GL as GL
+        from tostudents.libs import texture
+    except ImportError:
+        return None
+    if not glfw.init():
+        return None
+    glfw.window_hint(glfw.VISIBLE, False)
+    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
+    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
+    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, GL.GL_TRUE)
+    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
+    win = glfw.create_window(64, 64, 'bench', None, None)
+    if not win:
+        glfw.terminate()
+        return None
+    glfw.make_context_current(win)
+
+    def upload(levels_fn):
+        def run():
+            tex = GL.glGenTextures(1)
+            levels = levels_fn()
+            height, width = levels[0].shape[:2]
+            texture._allocate(tex, width, height, mode, True, GL.GL_REPEAT)
+            texture._upload(tex, levels, mode, True)
+            GL.glFinish()
+            GL.glDeleteTextures(1, [tex])
+        return run
+
+    baked_texture.bake(path, False, mode)
+    times = {
+        'pil+upload': best_of(upload(lambda: [baked_texture.decode(path, False, mode)])),
+        'mmap+upload': best_of(upload(lambda: baked_texture.load(path, False, mode))),
+    }
+    glfw.destroy_window(win)
+    glfw.terminate()
+    return times
+
+
+def main(paths):
+    folder = None
+    if not paths:
+        folder = tempfile.mkdtemp(prefix='bench_textures_')
+        paths = make_images(folder)
+
+    for path in paths:
+        size = os.path.getsize(path) / 2**20
+        print('%s (%.1f MB on disk)' % (os.path.basename(path), size))
+        times = cpu_times(path)
+        times.update(gl_times(path) or {})
+        for name, seconds in times.items():
+            print('  %-12s %9.1f ms' % (name, seconds * 1e3))
+        if 'pil' in times:
+            print('  mmap speedup over pil: %.1fx' % (times['pil'] / times['mmap']))
+        baked = baked_texture.baked_path(path, False, 'RGBA')
+        print('  baked file  %9.1f MB' % (os.path.getsize(baked) / 2**20))
+
+    if folder is not None:
+        print('images and baked files left in %s' % folder)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
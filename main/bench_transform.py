@@ -0,0 +1,115 @@
+"""
+Per-call cost of the libs.transform helpers: before the float32 rework,
+now, and now writing into a preallocated 'out'.
+
+    python -m tostudents.main.bench_transform [--number N]
+
+The 'before' versions are copies of the former helpers; a float64 result
+also pays the float32 conversion PyOpenGL makes at upload, which is timed
+with it. The B columns are the bytes a call holds at its peak (tracemalloc):
+the result and the temporaries it builds on the way.
+"""
+import argparse
+import math
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from tostudents.libs import transform as T
+
+
+# former helpers ----------------------------------------------------------
+def legacy_normalized(vector):
+    norm = math.sqrt(sum(vector*vector))
+    return vector / norm if norm > 0. else vector
+
+
+def legacy_scale(x, y=None, z=None):
+    y, z = (x, x) if y is None or z is None else (y, z)
+    return np.diag((x, y, z, 1))
+
+
+def legacy_lookat(eye, target, up):
+    view = legacy_normalized(T.vec(target)[:3] - T.vec(eye)[:3])
+    up = legacy_normalized(T.vec(up)[:3])
+    right = np.cross(view, up)
+    up = np.cross(right, view)
+    rotation = np.identity(4)
+    rotation[:3, :3] = np.vstack([right, up, -view])
+    return rotation @ T.translate(-eye)
+
+
+def legacy_quaternion_mul(q1, q2):
+    return np.dot(np.array([[q1[0], -q1[1], -q1[2], -q1[3]],
+                            [q1[1],  q1[0], -q1[3],  q1[2]],
+                            [q1[2],  q1[3],  q1[0], -q1[1]],
+                            [q1[3], -q1[2],  q1[1],  q1[0]]]), q2)
+
+
+def legacy_model(t, r, s):
+    return (T.translate(t) @ T.rotate((1, 0, 0), r[0]) @ T.rotate((0, 1, 0), r[1])
+            @ T.rotate((0, 0, 1), r[2]) @ legacy_scale(*s))
+
+
+def uploaded(matrix):
+    """ what the upload does with the matrix: a float32 contiguous copy if needed """
+    return np.ascontiguousarray(matrix, 'f')
+
+
+def cases():
+    """ (name, before, now, now with out) callables """
+    eye, target, up = np.array([1, 2, 3], 'f'), np.array([0, 0, 0], 'f'), np.array([0, 1, 0], 'f')
+    vector = np.array([1, 2, 3], 'f')
+    q1, q2 = T.quaternion_from_euler(10, 20, 30), T.quaternion_from_euler(40, 50, 60)
+    t, r, s = (0.5, 1.0, -2.0), (10.0, 20.0, 30.0), (1.0, 2.0, 3.0)
+    out, qout = np.empty((4, 4), 'f'), np.empty(4, 'f')
+    return [
+        ('normalized', lambda: legacy_normalized(vector), lambda: T.normalized(vector), None),
+        ('scale', lambda: uploaded(legacy_scale(1.0, 2.0, 3.0)), lambda: uploaded(T.scale(1.0, 2.0, 3.0)),
+         lambda: uploaded(T.scale(1.0, 2.0, 3.0, out=out))),
+        ('translate', lambda: uploaded(T.translate(t)), None, lambda: uploaded(T.translate(t, out=out))),
+        ('rotate', lambda: uploaded(T.rotate((1, 2, 3), 40)), None, lambda: uploaded(T.rotate((1, 2, 3), 40, out=out))),
+        ('lookat', lambda: uploaded(legacy_lookat(eye, target, up)), lambda: uploaded(T.lookat(eye, target, up)),
+         lambda: uploaded(T.lookat(eye, target, up, out=out))),
+        ('quaternion_mul', lambda: legacy_quaternion_mul(q1, q2), lambda: T.quaternion_mul(q1, q2),
+         lambda: T.quaternion_mul(q1, q2, out=qout)),
+        ('quaternion_matrix', lambda: uploaded(T.quaternion_matrix(q1)), None,
+         lambda: uploaded(T.quaternion_matrix(q1, out=out))),
+        ('model T@Rx@Ry@Rz@S', lambda: uploaded(legacy_model(t, r, s)), lambda: uploaded(T.trs_euler(t, r, s)),
+         lambda: uploaded(T.trs_euler(t, r, s, out=out))),
+    ]
+
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def peak_bytes(fn):
+    fn()                                    # warm caches out of the measurement
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per timing')
+    args = parser.parse_args(argv)
+
+    print('%-22s %10s %10s %10s %9s %9s %9s' % ('helper', 'before us', 'now us', 'out= us',
+                                                 'before B', 'now B', 'out= B'))
+    for name, before, now, into in cases():
+        now = now or before                 # same code, only 'out' is new
+        times = [per_call_us(fn, args.number) if fn else None for fn in (before, now, into)]
+        peaks = [peak_bytes(fn) if fn else None for fn in (before, now, into)]
+        print('%-22s %10s %10s %10s %9s %9s %9s' % ((name,) + tuple(
+            '-' if v is None else '%.2f' % v for v in times) + tuple('-' if v is None else v for v in peaks)))
+
+
+if __name__ == '__main__':
+    main()
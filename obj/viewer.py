@@ -2,8 +2,10 @@ import OpenGL.GL as GL
 import glfw
 import numpy as np
 from itertools import cycle
-from libs.transform import Trackball
-from Obj.load import ObjLoader
+from tostudents.libs.transform import Trackball
+from tostudents.object3d.load import ObjLoader
+from tostudents.libs import gl_state
+from tostudents.libs import texture
 
 
 class Viewer:
@@ -40,7 +42,7 @@ class Viewer:
 
         # Initialize GL settings
         GL.glClearColor(0.2, 0.2, 0.25, 1.0)  # Dark blue-gray background
-        GL.glEnable(GL.GL_DEPTH_TEST)         # Enable depth testing for 3D
+        gl_state.enable(GL.GL_DEPTH_TEST)         # Enable depth testing for 3D
         GL.glDepthFunc(GL.GL_LESS)            # Depth test function
 
         # Initially empty list of objects to draw
@@ -48,6 +50,10 @@ class Viewer:
 
     def run(self):
         while not glfw.window_should_close(self.win):
+            gl_state.begin_frame()
+            # upload textures decoded in the background (per-frame budget)
+            texture.process_uploads()
+
             # Clear color and depth buffers
             GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
@@ -76,7 +82,7 @@ class Viewer:
                 glfw.set_window_should_close(self.win, True)
 
             if key == glfw.KEY_W:
-                GL.glPolygonMode(GL.GL_FRONT_AND_BACK, next(self.fill_modes))
+                gl_state.polygon_mode(next(self.fill_modes))
 
             # Forward key events to drawables
             for drawable in self.drawables:
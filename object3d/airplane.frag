@@ -3,8 +3,9 @@ in vec2 fragTexCoord;
 out vec4 outColor;
 
 uniform sampler2D texSampler;
+uniform vec3 diffuse = vec3(1.0);   // Kd of the material being drawn
 
 void main()
 {
-    outColor = texture(texSampler, fragTexCoord);
+    outColor = texture(texSampler, fragTexCoord) * vec4(diffuse, 1.0);
 }
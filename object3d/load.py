@@ -1,17 +1,42 @@
+import ctypes
+import queue
+import threading
+
 from OpenGL.GL import *
 import OpenGL.GL as GL
 import numpy as np
-from PIL import Image
 from tostudents.libs.shader import *
 from tostudents.libs.buffer import *
 import glfw
+from tostudents.libs import gl_state
+from tostudents.libs import texture
+from tostudents.libs import meshopt
+from tostudents.libs import simplify
+from tostudents.libs.bounds import Bounded
+from tostudents.object3d import obj_parser
+from tostudents.object3d import mesh_cache
+from tostudents.object3d import mesh_file
+from tostudents.object3d import mtl
 
 
-class ObjLoader:
-    def __init__(self, filepath, vert_shader, frag_shader, texture_path=None):
+class ObjLoader(Bounded):
+    def __init__(self, filepath, vert_shader, frag_shader, texture_path=None, cache=True, lazy=False,
+                 optimize=True, workers=None, lods=()):
         self.filepath = filepath
+        self.cache = cache          # parse through the binary sidecar cache (mesh_cache)
+        self.lazy = lazy            # memory mapped mesh file streamed to the GPU (mesh_file)
+        self.optimize = optimize    # reorder triangles for the vertex cache (meshopt.tipsify)
+        self.acmr = None            # (before, after) the reordering, with optimize
+        self.workers = workers      # parsing processes, None: obj_parser.load decides
+        self.mesh = None
+        self.materials = {}         # name -> mtl.Material, from the model's mtllib files
+        self.draw_ranges = []       # (Material or None, first index, index count), one draw per material
+        self.lods = lods            # triangle ratios of the simplified levels to build (libs/simplify.py)
+        self.lod_ranges = []        # draw_ranges of each level, [0] is the full model
+        self.lod = 0                # level draw() uses
         self.vert_coords = []     # v
         self.text_coords = []     # vt
+        self.norm_coords = []     # vn
 
         self.vertex_index = []
         self.texture_index = []
@@ -20,95 +45,154 @@ class ObjLoader:
 
         # --- Create VAO and Shader ---
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
 
         self.texture = None
         if texture_path:
             self.texture = self.load_texture(texture_path)
+        # map_Kd textures, each image loaded once whatever the materials sharing it
+        self.material_textures = {}
+        for material, _, _ in self.draw_ranges:
+            if material is not None and material.texture and material.texture not in self.material_textures:
+                self.material_textures[material.texture] = self.load_texture(material.texture)
 
     # ------------------------------------------------------------
     # Load .OBJ file
     # ------------------------------------------------------------
     def load(self):
-        for line in open(self.filepath, 'r'):
-            if line.startswith('#'):
-                continue
-            values = line.strip().split()
-            if not values:
-                continue
-
-            # Vertex
-            if values[0] == 'v':
-                self.vert_coords.append([float(v) for v in values[1:4]])
-
-            # Texture coordinates
-            elif values[0] == 'vt':
-                self.text_coords.append([float(v) for v in values[1:3]])
-
-            # elif values[0] == 'vn':
-            #     self.norm_coords.append([float(v) for v in values[1:4]])
-
-            # Face
-            elif values[0] == 'f':
-                face_i, text_i = [], []
-                for v in values[1:4]:
-                    w = v.split('/')
-                    face_i.append(int(w[0]) - 1)
-                    if len(w) >= 2 and w[1] != '':
-                        text_i.append(int(w[1]) - 1)
-                self.vertex_index.append(face_i)
-                self.texture_index.append(text_i)
-
-        # flat the index list   
-        self.vertex_index = [y for x in self.vertex_index for y in x]
-        self.texture_index = [y for x in self.texture_index for y in x]
-
-        vertices = []
-        texcoords = []
-
-        for i in self.vertex_index:
-            vertices.extend(self.vert_coords[i])
-        for i in self.texture_index:
-            texcoords.extend(self.text_coords[i])
-
-        self.vertices = np.array(vertices, dtype='float32')
-        self.texcoords = np.array(texcoords, dtype='float32')
-        self.indices = np.array(range(len(self.vertex_index)), dtype='int32')
+        """ bulk parse (see obj_parser) or cached arrays (see mesh_cache), then
+            one vertex per distinct (v, vt, vn) corner of the face triangles,
+            in vertex cache friendly order (see libs/meshopt.py); triangles
+            are grouped by usemtl material, one draw range each """
+        if self.lazy:
+            # arrays are mapped, not read: pages load when setup() streams them
+            self.mesh = mesh_file.load(self.filepath)
+            self.vertices = self.mesh.array('position')
+            self.texcoords = self.mesh.array('texcoord') if 'texcoord' in self.mesh \
+                else np.zeros((0, 2), dtype='float32')
+            self.normals = self.mesh.array('normal')
+            self.indices = self.mesh.array('index')
+            self.draw_ranges = [(None, 0, len(self.indices))]
+            self.lod_ranges = [self.draw_ranges]
+            return
+
+        obj = mesh_cache.load(self.filepath, workers=self.workers) if self.cache \
+            else obj_parser.load(self.filepath, self.workers)
+        self.vert_coords = obj.positions
+        self.text_coords = obj.texcoords
+
+        if not obj.has_normals():
+            obj = obj.with_normals()
+        self.norm_coords = obj.normals
+        self.materials = mtl.load_libraries(self.filepath, obj.mtllibs)
+
+        # stable sort: triangles of a material stay in file order
+        triangle_materials = obj.triangle_materials()
+        order = np.argsort(triangle_materials, kind='stable')
+        triangle_materials = triangle_materials[order]
+        triangles = obj.triangles().reshape(-1, 3, 3)[order].reshape(-1, 3)
+        corners, indices = meshopt.deduplicate(triangles)
+        ids, firsts, counts = np.unique(triangle_materials, return_index=True, return_counts=True)
+        ranges = [(int(i), 3 * int(first), 3 * int(count)) for i, first, count in zip(ids, firsts, counts)]
+        if self.optimize:
+            before = meshopt.acmr(indices)
+            indices = np.concatenate([indices[:0]] + [meshopt.tipsify(indices[first:first + count], len(corners))
+                                                      for _, first, count in ranges])
+            self.acmr = (before, meshopt.acmr(indices))
+            print('[INFO] %s: %d vertices, %d materials, ACMR %.3f -> %.3f'
+                  % (self.filepath, len(corners), len(ranges), self.acmr[0], self.acmr[1]))
+        indices, levels = self._simplify(corners, indices, ranges)
+        self.lod_ranges = [[(self.materials.get(obj.materials[i]) if i >= 0 else None, first, count)
+                            for i, first, count in level] for level in levels]
+        self.draw_ranges = self.lod_ranges[0]
+        order, self.indices = meshopt.reorder_vertices(indices, len(corners))
+        corners = corners[order]
+
+        self.vertex_index = corners[:, 0]
+        self.texture_index = corners[:, 1]
+        self.normal_index = corners[:, 2]
+        self.vertices = self.vert_coords[self.vertex_index]
+        self.normals = self.norm_coords[self.normal_index]
+        # corners without vt get (0, 0), models without any keep an empty array
+        has_uv = self.texture_index >= 0
+        self.texcoords = np.zeros((len(corners) if has_uv.any() else 0, 2), dtype='float32')
+        self.texcoords[has_uv] = self.text_coords[self.texture_index[has_uv]]
+
+    def _simplify(self, corners, indices, ranges):
+        """ (indices of every level one after the other, ranges of each level)
+
+        Each material range is simplified on its own, so material borders
+        stay; the v index welds the (v, vt, vn) corners, keeping seams.
+        """
+        levels = [ranges]
+        parts = [indices]
+        if not self.lods:
+            return indices, levels
+        positions = self.vert_coords[corners[:, 0]]
+        per_range = [simplify.lods(positions, indices[first:first + count], self.lods, weld=corners[:, 0])
+                     for _, first, count in ranges]
+        offset = len(indices)
+        for level in range(len(self.lods)):
+            ranges = []
+            for (material, _, _), chain in zip(levels[0], per_range):
+                part = chain[level]
+                if self.optimize:
+                    part = meshopt.tipsify(part, len(corners))
+                ranges.append((material, offset, len(part)))
+                parts.append(part)
+                offset += len(part)
+            levels.append(ranges)
+            print('[INFO] %s: LOD %d, %d triangles' % (self.filepath, level + 1, sum(c for _, _, c in ranges) // 3))
+        return np.concatenate(parts), levels
+
+    def triangles(self):
+        """ triangles of the full model (LOD 0), for bounds.BVH """
+        count = sum(count for _, _, count in self.lod_ranges[0])
+        return np.asarray(self.indices[:count]).reshape(-1, 3)
 
     # ------------------------------------------------------------
     # Load texture từ file ảnh
     # ------------------------------------------------------------
     def load_texture(self, path):
-        img = Image.open(path)
-        img_data = np.array(img.convert("RGBA"), dtype=np.uint8)
-        tex = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, tex)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA,
-                        img.width, img.height, 0,
-                        GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, img_data)
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-        return tex
+        return texture.load_async(path, flip=False, mode="RGBA")
+
+    def __del__(self):
+        if getattr(self, "texture", None) is not None:
+            texture.release(self.texture)
+        for tex in getattr(self, "material_textures", {}).values():
+            texture.release(tex)
 
     # ------------------------------------------------------------
     # Setup GPU buffer
     # ------------------------------------------------------------
     def setup(self):
+        if self.mesh is not None:
+            return self._setup_streamed()
         # Vertex
         self.vao.add_vbo(0, self.vertices, ncomponents=3, stride=0, offset=None)
         # Texture coordinates
         self.vao.add_vbo(1, self.texcoords, ncomponents=2, stride=0, offset=None)
+        # Normals, from the file or area weighted
+        self.vao.add_vbo(2, self.normals, ncomponents=3, stride=0, offset=None)
         # Indices
         self.vao.add_ebo(self.indices)
         return self
 
+    def _setup_streamed(self):
+        """ setup() of a lazy model: every attribute goes up in CHUNK slices """
+        self.vao.add_vbo_chunks(0, self.mesh.chunks('position'), self.mesh.nbytes('position'), ncomponents=3)
+        if 'texcoord' in self.mesh:
+            self.vao.add_vbo_chunks(1, self.mesh.chunks('texcoord'), self.mesh.nbytes('texcoord'), ncomponents=2)
+        self.vao.add_vbo_chunks(2, self.mesh.chunks('normal'), self.mesh.nbytes('normal'), ncomponents=3)
+        self.vao.add_ebo_chunks(self.mesh.chunks('index'), self.mesh.nbytes('index'))
+        return self
+
     # ------------------------------------------------------------
     # Draw object
     # ------------------------------------------------------------
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if projection is not None:
             self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
@@ -119,10 +203,19 @@ class ObjLoader:
 
        
 
-        #draw
+        #draw, one call per material: its map_Kd (or the model texture) and Kd
         self.vao.activate()
         #GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
-        GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
+        for material, first, count in self.lod_ranges[min(self.lod, len(self.lod_ranges) - 1)]:
+            tex = self.texture
+            diffuse = (1.0, 1.0, 1.0)
+            if material is not None:
+                tex = self.material_textures.get(material.texture, tex)
+                diffuse = material.diffuse
+            if tex is not None:
+                gl_state.bind_texture(tex)
+            self.uma.upload_uniform_vector3fv(np.array(diffuse, dtype=np.float32), 'diffuse')
+            GL.glDrawElements(GL.GL_TRIANGLES, count, GL.GL_UNSIGNED_INT, ctypes.c_void_p(4 * first))
 
 
        ## GL.glEnable(GL.GL_POLYGON_OFFSET_LINE)
@@ -132,5 +225,85 @@ class ObjLoader:
         #GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
        # GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
         #GL.glDisable(GL.GL_POLYGON_OFFSET_LINE)
-       
+
+
+class StreamingObjLoader(object):
+    """ ObjLoader drawn while it loads
+
+    A thread parses the file in batches (obj_parser.iter_batches); draw()
+    appends the batches ready so far to growable vertex buffers, at most
+    'upload_budget' bytes per frame, and draws the triangles loaded so far.
+    Vertices are not shared (no index buffer) so a batch never touches the
+    data already uploaded.
+    """
+    def __init__(self, filepath, vert_shader, frag_shader, texture_path=None,
+                 batch=obj_parser.BATCH_BYTES, upload_budget=8 * 2**20):
+        self.filepath = filepath
+        self.upload_budget = upload_budget
+        self.count = 0                  # vertices uploaded, drawn as triangles
+        self.done = False
+
+        self.vao = VAO()
+        self.shader = shader_variant(vert_shader, frag_shader)
+        self.uma = UManager(self.shader)
+
+        self.texture = None
+        if texture_path:
+            self.texture = texture.load_async(texture_path, flip=False, mode="RGBA")
+
+        self._batches = queue.Queue(maxsize=64)     # parsed ahead, bounded memory
+        self._thread = threading.Thread(target=self._parse, args=(batch,), daemon=True)
+        self._thread.start()
+
+    def _parse(self, batch):
+        # worker thread: no GL calls here
+        try:
+            for arrays in obj_parser.iter_batches(self.filepath, batch):
+                self._batches.put(arrays)
+        except Exception as e:
+            print('[ERROR] %s: %s' % (self.filepath, e))
+        self._batches.put(None)
+
+    def setup(self):
+        self.buffers = [GrowableVBO(self.vao, 0, 3), GrowableVBO(self.vao, 1, 2), GrowableVBO(self.vao, 2, 3)]
+        return self
+
+    def __del__(self):
+        if getattr(self, "texture", None) is not None:
+            texture.release(self.texture)
+
+    def process_batches(self, budget=None):
+        """ upload parsed batches, at most 'budget' bytes but at least one """
+        budget = self.upload_budget if budget is None else budget
+        nbytes = 0
+        while not self.done and (nbytes < budget or nbytes == 0):
+            try:
+                arrays = self._batches.get_nowait()
+            except queue.Empty:
+                break
+            if arrays is None:
+                self.done = True
+                print('[INFO] %s: %d triangles loaded' % (self.filepath, self.count // 3))
+                break
+            for buffer, rows in zip(self.buffers, arrays):
+                buffer.append(rows)
+                nbytes += rows.nbytes
+            self.count += len(arrays[0])
+
+    def draw(self, projection, view, model):
+        self.process_batches()
+        if not self.count:
+            return
+        gl_state.use_program(self.shader.render_idx)
+        if projection is not None:
+            self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        if view is not None:
+            self.uma.upload_uniform_matrix4fv(view, 'view', True)
+        if model is not None:
+            self.uma.upload_uniform_matrix4fv(model, 'model', True)
+        if self.texture is not None:
+            gl_state.bind_texture(self.texture, 0)
+            self.uma.upload_uniform_scalar1i(0, 'texSampler')
+        self.vao.activate()
+        GL.glDrawArrays(GL.GL_TRIANGLES, 0, self.count)
 
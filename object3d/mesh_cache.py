@@ -0,0 +1,149 @@
+"""
+Binary sidecar cache of parsed OBJ files.
+
+    python -m tostudents.object3d.mesh_cache [--force] model.obj|folder ...
+
+pre-warms the cache of the given models, folders are searched recursively
+for .obj files. The cache sits next to the model as '<model>.objb' and holds
+the ObjData arrays of obj_parser (material and library names as a JSON
+'names' array); it records the size and mtime of the OBJ
+it was made from, so an edited model is parsed again and its cache rewritten.
+The file is mapped with np.memmap, every array is a read-only view into the
+mapping and loading costs no text parsing at all:
+
+    header   4s magic, uint32 version, uint64 source size, source mtime_ns
+    arrays   for each of ARRAYS, uint64 (rows, columns, offset)
+    data     the arrays, each 8-byte aligned
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from tostudents.object3d import obj_parser
+
+MAGIC = b'OBJB'
+VERSION = 2                 # 2: face_materials and names
+SUFFIX = '.objb'
+
+# ObjData attribute -> dtype, in file order
+ARRAYS = (('positions', np.float32), ('texcoords', np.float32), ('normals', np.float32),
+          ('corners', np.int32), ('face_sizes', np.int32), ('face_materials', np.int32),
+          ('names', np.uint8))
+
+_HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('size', '<u8'), ('mtime', '<u8')])
+_ARRAY = np.dtype([('rows', '<u8'), ('columns', '<u8'), ('offset', '<u8')])
+
+
+def cache_path(path):
+    return path + SUFFIX
+
+
+def source_stamp(path):
+    """ (size, mtime_ns) of a model, what files derived from it are checked against """
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _names(obj):
+    text = json.dumps({'materials': obj.materials, 'mtllibs': obj.mtllibs})
+    return np.frombuffer(text.encode(), dtype=np.uint8)
+
+
+def write(path, obj, source):
+    """ store obj for the OBJ described by source (size, mtime_ns), atomically """
+    header = np.zeros(1, _HEADER)
+    header[0] = (MAGIC, VERSION) + tuple(source)
+    table = np.zeros(len(ARRAYS), _ARRAY)
+    offset = _HEADER.itemsize + _ARRAY.itemsize * len(ARRAYS)
+    arrays = []
+    for i, (name, dtype) in enumerate(ARRAYS):
+        array = _names(obj) if name == 'names' else getattr(obj, name)
+        array = np.ascontiguousarray(array, dtype=dtype)
+        columns = array.shape[1] if array.ndim == 2 else 0
+        table[i] = (array.shape[0], columns, offset)
+        arrays.append(array)
+        offset += -(-array.nbytes // 8) * 8
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for array in arrays:
+            f.write(array.tobytes())
+            f.write(b'\0' * (-array.nbytes % 8))
+    os.replace(tmp, path)
+
+
+def read(path, source=None):
+    """ ObjData backed by a read-only memory map of the cache file
+
+    source: expected (size, mtime_ns) of the OBJ, ValueError if the cache
+            was made from another version of it
+    """
+    data = np.memmap(path, dtype=np.uint8, mode='r')
+    header = data[:_HEADER.itemsize].view(_HEADER)[0]
+    if header['magic'] != MAGIC or header['version'] != VERSION:
+        raise ValueError('%s: not a mesh cache (version %d)' % (path, VERSION))
+    if source is not None and (int(header['size']), int(header['mtime'])) != tuple(source):
+        raise ValueError('%s: stale mesh cache' % path)
+    table = data[_HEADER.itemsize:_HEADER.itemsize + _ARRAY.itemsize * len(ARRAYS)].view(_ARRAY)
+    arrays = {}
+    for (name, dtype), (rows, columns, offset) in zip(ARRAYS, table):
+        shape = (int(rows), int(columns)) if columns else (int(rows),)
+        count = int(np.prod(shape))
+        arrays[name] = data[int(offset):int(offset) + count * np.dtype(dtype).itemsize].view(dtype).reshape(shape)
+    names = json.loads(arrays.pop('names').tobytes().decode())
+    return obj_parser.ObjData(**arrays, **names)
+
+
+def load(path, force=False, workers=None):
+    """ ObjData of the OBJ at path, from its cache when up to date
+
+    A missing or stale cache is rebuilt (parsed with obj_parser.load, see
+    'workers' there); if it cannot be written (read-only folder, ...) the
+    parsed data is returned uncached.
+    """
+    source = source_stamp(path)
+    target = cache_path(path)
+    if not force:
+        try:
+            return read(target, source)
+        except (OSError, ValueError):
+            pass
+    obj = obj_parser.load(path, workers)
+    try:
+        write(target, obj, source)
+    except OSError:
+        pass
+    return obj
+
+
+def _models(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for folder, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith('.obj'):
+                    yield os.path.join(folder, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-warm the binary cache of OBJ models')
+    parser.add_argument('paths', nargs='+', help='.obj files or folders to search')
+    parser.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='parsing processes (default: one per CPU for large files)')
+    args = parser.parse_args(argv)
+    for path in _models(args.paths):
+        obj = load(path, args.force, args.workers)
+        print('%s -> %s (%d vertices, %d faces, %.1f MB)' % (
+            path, cache_path(path), len(obj.positions), len(obj.face_sizes),
+            os.path.getsize(cache_path(path)) / 2**20))
+
+
+if __name__ == '__main__':
+    main()
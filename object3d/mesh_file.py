@@ -0,0 +1,159 @@
+"""
+GPU-ready mesh files for models too large to hold in memory.
+
+    python -m tostudents.object3d.mesh_file [--force] model.obj ...
+
+'<model>.mesh' holds the vertex attributes and indices of the triangles,
+one vertex per corner so the file can be written a chunk at a time. Nothing is read at open: an attribute is either a np.memmap
+view (array()) or a sequence of short-lived maps of CHUNK bytes (chunks()),
+which VAO.add_vbo_chunks streams into the buffer one slice at a time, so the
+pages of one chunk only are resident while uploading.
+
+    header      4s magic, uint32 version, uint64 source size, source mtime_ns,
+                uint32 attribute count, uint32 padding
+    attributes  for each, 16s name, 4s dtype, uint64 (rows, columns, offset)
+    data        the arrays, each starting on a page boundary
+
+The file is written chunk by chunk from the source's mesh cache, and, like
+the cache, rebuilt when the size or mtime of the source changes.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from tostudents.object3d import mesh_cache
+
+MAGIC = b'MSH1'
+VERSION = 3                 # 2: normal attribute, 3: texcoords of corners without vt are (0, 0)
+SUFFIX = '.mesh'
+CHUNK = 16 * 2**20          # bytes per streamed slice
+PAGE = 4096
+
+_HEADER = np.dtype([('magic', 'S4'), ('version', '<u4'), ('size', '<u8'), ('mtime', '<u8'),
+                    ('count', '<u4'), ('pad', '<u4')])
+_ATTRIBUTE = np.dtype([('name', 'S16'), ('dtype', 'S4'), ('rows', '<u8'), ('columns', '<u8'), ('offset', '<u8')])
+
+
+def mesh_path(path):
+    return path + SUFFIX
+
+
+class MeshFile(object):
+    """ Lazily read mesh file: attributes are only mapped when asked for """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = np.frombuffer(f.read(_HEADER.itemsize), _HEADER)[0]
+            if header['magic'] != MAGIC or header['version'] != VERSION:
+                raise ValueError('%s: not a mesh file (version %d)' % (path, VERSION))
+            table = np.frombuffer(f.read(_ATTRIBUTE.itemsize * int(header['count'])), _ATTRIBUTE)
+        self.source = (int(header['size']), int(header['mtime']))
+        self.attributes = {}        # name -> (dtype, shape, offset)
+        for name, dtype, rows, columns, offset in table:
+            shape = (int(rows), int(columns)) if columns else (int(rows),)
+            self.attributes[name.decode()] = (np.dtype(dtype.decode()), shape, int(offset))
+
+    def __contains__(self, name):
+        return name in self.attributes
+
+    def nbytes(self, name):
+        dtype, shape, _ = self.attributes[name]
+        return int(np.prod(shape)) * dtype.itemsize
+
+    def array(self, name):
+        """ the whole attribute as a read-only memory map, pages load on access """
+        dtype, shape, offset = self.attributes[name]
+        if not shape[0]:
+            return np.zeros(shape, dtype)
+        return np.memmap(self.path, dtype, 'r', offset, shape)
+
+    def chunks(self, name, nbytes=CHUNK):
+        """ the attribute as consecutive maps of about nbytes, each unmapped
+            once the caller drops it """
+        dtype, shape, offset = self.attributes[name]
+        row = dtype.itemsize * (shape[1] if len(shape) == 2 else 1)
+        step = max(1, nbytes // row)
+        for start in range(0, shape[0], step):
+            rows = min(step, shape[0] - start)
+            yield np.memmap(self.path, dtype, 'r', offset + start * row, (rows,) + shape[1:])
+
+
+def _expand(obj, column, values, step):
+    """ per-corner values[corners[:, column]] of the triangles, step faces at
+        a time; corners without one (-1) get zeros """
+    for start in range(0, len(obj.face_sizes), step):
+        index = obj.triangles(start, start + step)[:, column]
+        rows = values[index]
+        rows[index < 0] = 0
+        yield rows
+
+
+def _sequence(count, step):
+    for start in range(0, count, step):
+        yield np.arange(start, min(count, start + step), dtype=np.uint32)
+
+
+def write(path, obj, source, chunk=CHUNK):
+    """ store the triangles of an ObjData, one vertex per corner; normals are
+        computed (area weighted) if the model has none """
+    if not obj.has_normals():
+        obj = obj.with_normals()
+    triangles = obj.triangle_count()
+    step = max(1, chunk // (3 * 3 * 4))                 # faces per chunk of positions
+    attributes = [('position', np.float32, 3, _expand(obj, 0, obj.positions, step))]
+    if len(obj.texcoords) and (obj.corners[:, 1] >= 0).any():     # corners without vt get (0, 0)
+        attributes.append(('texcoord', np.float32, 2, _expand(obj, 1, obj.texcoords, step)))
+    attributes.append(('normal', np.float32, 3, _expand(obj, 2, obj.normals, step)))
+    attributes.append(('index', np.uint32, 0, _sequence(3 * triangles, chunk // 4)))
+
+    header = np.zeros(1, _HEADER)
+    header[0] = (MAGIC, VERSION) + tuple(source) + (len(attributes), 0)
+    table = np.zeros(len(attributes), _ATTRIBUTE)
+    offset = _HEADER.itemsize + _ATTRIBUTE.itemsize * len(attributes)
+    for i, (name, dtype, columns, _) in enumerate(attributes):
+        offset = -(-offset // PAGE) * PAGE
+        table[i] = (name, np.dtype(dtype).str, 3 * triangles, columns, offset)
+        offset += 3 * triangles * max(columns, 1) * np.dtype(dtype).itemsize
+
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+        for (_, dtype, _, chunks), entry in zip(attributes, table):
+            f.seek(int(entry['offset']))
+            for data in chunks:
+                f.write(data.astype(dtype, copy=False).tobytes())
+        f.truncate(offset)
+    os.replace(tmp, path)
+
+
+def load(path, force=False, chunk=CHUNK):
+    """ MeshFile for the OBJ at path, (re)built when missing or stale """
+    source = mesh_cache.source_stamp(path)
+    target = mesh_path(path)
+    if not force:
+        try:
+            mesh = MeshFile(target)
+            if mesh.source == source:
+                return mesh
+        except (OSError, ValueError):
+            pass
+    write(target, mesh_cache.load(path), source, chunk)
+    return MeshFile(target)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert OBJ models to streamable mesh files')
+    parser.add_argument('models', nargs='+')
+    parser.add_argument('--force', action='store_true', help='rebuild even if up to date')
+    args = parser.parse_args(argv)
+    for path in args.models:
+        mesh = load(path, args.force)
+        print('%s -> %s (%s, %.1f MB)' % (
+            path, mesh.path, ', '.join('%s %s' % (name, shape) for name, (_, shape, _) in mesh.attributes.items()),
+            os.path.getsize(mesh.path) / 2**20))
+
+
+if __name__ == '__main__':
+    main()
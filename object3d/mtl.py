@@ -0,0 +1,77 @@
+"""
+Wavefront MTL material libraries, the part ObjLoader draws with.
+
+    newmtl      starts a material
+    Kd Ka Ks    diffuse, ambient, specular color
+    Ns          specular exponent
+    map_Kd      diffuse texture, the last token is the file (options before it
+                are ignored), relative to the .mtl file
+
+Other statements are skipped. A usemtl naming a material no library defines
+draws with the default Material.
+"""
+import os
+
+
+class Material(object):
+    def __init__(self, name, diffuse=(1.0, 1.0, 1.0), ambient=(0.0, 0.0, 0.0), specular=(0.0, 0.0, 0.0),
+                 shininess=0.0, texture=None):
+        self.name = name
+        self.diffuse = diffuse
+        self.ambient = ambient
+        self.specular = specular
+        self.shininess = shininess
+        self.texture = texture      # image path of map_Kd, or None
+
+    def __repr__(self):
+        return 'Material(%r, diffuse=%r, texture=%r)' % (self.name, self.diffuse, self.texture)
+
+
+def _color(values):
+    values = [float(v) for v in values[:3]]
+    return tuple(values * 3 if len(values) == 1 else values)
+
+
+def parse(text, directory=''):
+    """ {name: Material} of the MTL text, texture paths joined to directory """
+    materials = {}
+    material = None
+    for line in text.splitlines():
+        values = line.split('#', 1)[0].split()
+        if not values:
+            continue
+        key = values[0]
+        if key == 'newmtl':
+            material = materials[' '.join(values[1:])] = Material(' '.join(values[1:]))
+        elif material is None or len(values) < 2:
+            continue
+        elif key == 'Kd':
+            material.diffuse = _color(values[1:])
+        elif key == 'Ka':
+            material.ambient = _color(values[1:])
+        elif key == 'Ks':
+            material.specular = _color(values[1:])
+        elif key == 'Ns':
+            material.shininess = float(values[1])
+        elif key == 'map_Kd':
+            path = values[-1].replace('\\', '/')
+            material.texture = os.path.normpath(os.path.join(directory, path))
+    return materials
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return parse(f.read(), os.path.dirname(path))
+
+
+def load_libraries(obj_path, mtllibs):
+    """ {name: Material} of the mtllib files of an OBJ, relative to it; a
+        missing library is reported and skipped, later ones win on clashes """
+    materials = {}
+    for name in mtllibs:
+        path = os.path.join(os.path.dirname(obj_path), name)
+        try:
+            materials.update(load(path))
+        except OSError as e:
+            print('[WARN] %s: %s' % (obj_path, e))
+    return materials
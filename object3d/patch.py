@@ -6,6 +6,7 @@ from tostudents.libs.shader import *
 from tostudents.libs import transform as T
 from tostudents.libs.buffer import *
 import ctypes
+from tostudents.libs import gl_state
 
 
 
@@ -79,7 +80,7 @@ class Patch(object):
         shininess = 100.0
         mode = 1
 
-        GL.glUseProgram(self.shader1.render_idx)
+        gl_state.use_program(self.shader1.render_idx)
         self.uma1.upload_uniform_matrix4fv(normalMat, 'normalMat', True)
         self.uma1.upload_uniform_matrix4fv(projection, 'projection', True)
         self.uma1.upload_uniform_matrix4fv(modelview, 'modelview', True)
@@ -93,7 +94,7 @@ class Patch(object):
 
 
         ####
-        GL.glUseProgram(self.shader2.render_idx)
+        gl_state.use_program(self.shader2.render_idx)
         self.uma2.upload_uniform_matrix4fv(normalMat, 'normalMat', True)
         self.uma2.upload_uniform_matrix4fv(projection, 'projection', True)
         self.uma2.upload_uniform_matrix4fv(modelview, 'modelview', True)
@@ -109,10 +110,10 @@ class Patch(object):
 
     def draw(self, projection, view, model):
         self.vao.activate()
-        GL.glUseProgram(self.shader1.render_idx)
+        gl_state.use_program(self.shader1.render_idx)
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, None)
 
-        GL.glUseProgram(self.shader2.render_idx)
+        gl_state.use_program(self.shader2.render_idx)
         offset = ctypes.c_void_p(2*4)  # None
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, offset)
         self.vao.deactivate()
@@ -192,7 +193,7 @@ class PatchEx(object):
         shininess = 100.0
         mode = 1
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         self.uma.upload_uniform_matrix4fv(normalMat, 'normalMat', True)
         self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
         self.uma.upload_uniform_matrix4fv(modelview, 'modelview', True)
@@ -210,11 +211,11 @@ class PatchEx(object):
     def draw(self, projection, view, model):
         self.vao.activate()
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         self.uma.upload_uniform_scalar1i(1, 'face')
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, None)
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         self.uma.upload_uniform_scalar1i(2, 'face')
         offset = ctypes.c_void_p(2*4)  # None
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, offset)
@@ -4,10 +4,21 @@ from tostudents.libs.buffer import *
 import ctypes
 import cv2
 import glfw
+from tostudents.libs import gl_state
+from tostudents.object3d.textured.prepare import load_atlas
 
 class TexturedPatch(object):
-    def __init__(self, vert_shader, frag_shader):
+    # atlas mode: image shown on (face 1, face 2) for each selected_texture
+    ATLAS_FACES = {1: ("thuylinh", "tieuvi"), 2: ("ledinh", "lotu")}
+
+    def __init__(self, vert_shader, frag_shader, atlas=None):
         """
+        atlas: metadata file written by prepare.build_atlas holding the four
+               images of ATLAS_FACES; all faces then sample one texture
+               (bound once) through per-face UV rects, instead of the
+               texture1/texture2 strips
+
+
         self.vertex_attrib:
         each row: v.x, v.y, v.z, c.r, c.g, c.b, t.x, t.y, n.x, n.y, n.z
         =>  (a) stride = nbytes(v0.x -> v1.x) = 9*4 = 36
@@ -41,6 +52,7 @@ class TexturedPatch(object):
         #
 
         self.selected_texture = 1
+        self.atlas = load_atlas(atlas) if atlas else None     # (image, {name: uv rect})
 
 
     def setup(self):
@@ -56,8 +68,11 @@ class TexturedPatch(object):
 
         self.vao.add_ebo(self.indices)
 
-        self.uma.setup_texture("texture1", "./textured/image/texture1.jpeg")
-        self.uma.setup_texture("texture2", "./textured/image/texture2.jpeg")
+        if self.atlas:
+            self.uma.setup_texture("texture1", self.atlas[0])
+        else:
+            self.uma.setup_texture("texture1", "./textured/image/texture1.jpeg")
+            self.uma.setup_texture("texture2", "./textured/image/texture2.jpeg")
 
         projection = T.ortho(-0.5, 2.5, -0.5, 1.5, -1, 1)
         modelview = np.identity(4, 'f')
@@ -101,18 +116,28 @@ class TexturedPatch(object):
     def draw(self, projection, view, model):
         self.vao.activate()
 
-        self.uma.upload_uniform_scalar1i(self.selected_texture, 'selected_texture')
+        self.uma.upload_uniform_scalar1i(1 if self.atlas else self.selected_texture, 'selected_texture')
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         self.uma.upload_uniform_scalar1i(1, 'face')
+        if self.atlas:
+            self.uma.upload_uniform_vector4fv(self._uv_transform(1), 'uv_transform')
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, None)
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         self.uma.upload_uniform_scalar1i(2, 'face')
+        if self.atlas:
+            self.uma.upload_uniform_vector4fv(self._uv_transform(2), 'uv_transform')
         offset = ctypes.c_void_p(2*4)  # None
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, 4, GL.GL_UNSIGNED_INT, offset)
         self.vao.deactivate()
 
+    def _uv_transform(self, face):
+        """ offset & scale taking face's texcoords (u in [0, 0.5] or [0.5, 1]) to its atlas rect """
+        u, v, w, h = self.atlas[1][self.ATLAS_FACES[self.selected_texture][face - 1]]
+        u0 = 0.5 * (face - 1)
+        return np.array([u - u0 * 2 * w, v, 2 * w, h], dtype=np.float32)
+
     def key_handler(self, key):
 
         if key == glfw.KEY_1:
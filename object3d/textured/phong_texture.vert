@@ -7,6 +7,7 @@ layout(location = 2) in vec3 normal;
 layout(location = 3) in vec2 texcoord;
 
 uniform mat4 projection, modelview;
+uniform vec4 uv_transform = vec4(0.0, 0.0, 1.0, 1.0);  // offset.xy, scale.zw (texture atlas)
 out vec3 normal_interp;
 out vec3 color_interp;
 out vec3 vert_pos;
@@ -20,6 +21,6 @@ void main(){
   mat4 normal_matrix = transpose(inverse(modelview));
   normal_interp = vec3(normal_matrix * vec4(normal, 0.0));
 
-  texcoord_interp = texcoord;
+  texcoord_interp = uv_transform.xy + texcoord * uv_transform.zw;
   gl_Position = projection * vert_pos4;
 }
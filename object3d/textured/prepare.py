@@ -1,3 +1,20 @@
+"""
+Texture preparation: horizontal strips (prepare_texture) and packed atlases.
+
+    python -m tostudents.object3d.textured.prepare [--size W H] [--padding P]
+                                                   [--workers N] out_image in_image ...
+
+packs the input images into one near-square atlas, out_image, and writes
+out_image's UV rects next to it (same name, .json), see build_atlas and
+load_atlas. Without arguments the two strips used by TexturedPatch are
+rebuilt as before.
+"""
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
 
@@ -7,14 +24,123 @@ def prepare_texture(size, in_files, out_file):
     texture = np.concatenate(images, axis=1)
     cv2.imwrite(out_file, texture)
 
-size = (500, 500)
-in_files_1 = ["./image/thuylinh.jpeg",
-          "./image/tieuvi.jpeg"
-          ]
-out_file_1 = "./image/texture1.jpeg"
-in_files_2 = ["./image/ledinh.jpeg",
-              "./image/lotu.jpeg"
-              ]
-out_file_2 = "./image/texture2.jpeg"
-prepare_texture(size, in_files_1, out_file_1)
-prepare_texture(size, in_files_2, out_file_2)
\ No newline at end of file
+
+def _load_image(args):
+    """ process pool job: decode (and resize) one image, pixels stay BGR like cv2 """
+    path, size = args
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise IOError('cannot read image %s' % path)
+    return cv2.resize(image, tuple(size), interpolation=cv2.INTER_AREA) if size else image
+
+
+def pack(sizes, padding=0):
+    """ shelf packing of (w, h) sizes into a near-square area
+
+    Images are placed tallest first, left to right, on rows no wider than
+    the side of a square holding their total area. Returns the (x, y) of
+    each image, in input order, and the (width, height) used.
+    """
+    padded = [(w + 2 * padding, h + 2 * padding) for w, h in sizes]
+    side = max(max(w for w, _ in padded), int(math.ceil(math.sqrt(sum(w * h for w, h in padded)))))
+    order = sorted(range(len(sizes)), key=lambda i: (-padded[i][1], -padded[i][0]))
+
+    positions = [None] * len(sizes)
+    x = y = row_height = width = 0
+    for i in order:
+        w, h = padded[i]
+        if x + w > side:            # next shelf
+            x, y, row_height = 0, y + row_height, 0
+        positions[i] = (x + padding, y + padding)
+        x += w
+        row_height = max(row_height, h)
+        width = max(width, x)
+    return positions, (width, y + row_height)
+
+
+def build_atlas(in_files, out_file, size=None, padding=4, workers=None):
+    """ pack in_files into the atlas image out_file, returns its metadata
+
+    size: (w, h) every image is resized to, None keeps their own sizes
+    padding: pixels around each image filled with its edge pixels, so linear
+             filtering and mipmaps do not bleed neighbours in
+    The metadata, also written to out_file with a .json extension, maps each
+    image name (file name without extension) to its rect in pixels and in
+    UV [u, v, w, h], with v going down like image rows (the convention of
+    UManager.setup_texture, which does not flip). Two images with the same
+    name (a/brick.png, b/brick.jpg) raise ValueError.
+    """
+    names = [os.path.splitext(os.path.basename(path))[0] for path in in_files]
+    seen = {}
+    for path, name in zip(in_files, names):
+        if name in seen:
+            raise ValueError('atlas: %s and %s are both named %r' % (seen[name], path, name))
+        seen[name] = path
+
+    with ProcessPoolExecutor(workers) as pool:
+        images = list(pool.map(_load_image, [(f, size) for f in in_files]))
+
+    positions, (width, height) = pack([(im.shape[1], im.shape[0]) for im in images], padding)
+    atlas = np.zeros((height, width, 3), dtype=np.uint8)
+    rects = {}
+    for name, image, (x, y) in zip(names, images, positions):
+        h, w = image.shape[:2]
+        if padding:
+            atlas[y - padding:y + h + padding, x - padding:x + w + padding] = \
+                np.pad(image, ((padding, padding), (padding, padding), (0, 0)), mode='edge')
+        else:
+            atlas[y:y + h, x:x + w] = image
+        rects[name] = {'pixels': [x, y, w, h],
+                       'uv': [x / width, y / height, w / width, h / height]}
+    cv2.imwrite(out_file, atlas)
+
+    meta = {'image': os.path.basename(out_file), 'width': width, 'height': height,
+            'padding': padding, 'rects': rects}
+    with open(atlas_meta_path(out_file), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def atlas_meta_path(atlas_image):
+    return os.path.splitext(atlas_image)[0] + '.json'
+
+
+def load_atlas(meta_file):
+    """ (atlas image path, {name: (u, v, w, h)}) from build_atlas metadata """
+    with open(meta_file) as f:
+        meta = json.load(f)
+    image = os.path.join(os.path.dirname(os.path.abspath(meta_file)), meta['image'])
+    return image, {name: tuple(rect['uv']) for name, rect in meta['rects'].items()}
+
+
+def remap_uv(texcoords, rect):
+    """ texture coordinates of a single image moved into its atlas rect """
+    u, v, w, h = rect
+    return (np.asarray(texcoords, dtype=np.float32) * np.float32([w, h]) + np.float32([u, v])).astype(np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack images into a texture atlas with UV rects')
+    parser.add_argument('out_image', nargs='?')
+    parser.add_argument('in_images', nargs='*')
+    parser.add_argument('--size', type=int, nargs=2, metavar=('W', 'H'),
+                        help='resize every image to W x H (default: keep sizes)')
+    parser.add_argument('--padding', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=None, help='decoding processes (default: CPUs)')
+    args = parser.parse_args(argv)
+
+    if args.out_image is None:
+        size = (500, 500)
+        prepare_texture(size, ["./image/thuylinh.jpeg", "./image/tieuvi.jpeg"], "./image/texture1.jpeg")
+        prepare_texture(size, ["./image/ledinh.jpeg", "./image/lotu.jpeg"], "./image/texture2.jpeg")
+        return
+    if not args.in_images:
+        parser.error('no input images')
+
+    meta = build_atlas(args.in_images, args.out_image, args.size, args.padding, args.workers)
+    print('%s: %dx%d, %d images -> %s' % (args.out_image, meta['width'], meta['height'],
+                                          len(meta['rects']), atlas_meta_path(args.out_image)))
+
+
+if __name__ == '__main__':
+    main()
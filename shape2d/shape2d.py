@@ -3,6 +3,10 @@ import OpenGL.GL as GL
 from math import sin, cos, pi
 from tostudents.libs.shader import *
 from tostudents.libs.buffer import *
+from tostudents.libs import gl_state
+
+
+WIREFRAME_COLOR = np.array([1.0, 1.0, 1.0], dtype=np.float32)
 
 
 # ============================================================
@@ -35,7 +39,7 @@ class Shape2DBase:
             fs = "/Users/phamnguyenviettri/Ses251/ComputerGraphic/tostudents/shader2d/flat2d.frag"
 
 
-        self.shader = Shader(vs, fs)
+        self.shader = shader_variant(vs, fs)
         self.uma = UManager(self.shader)
         self.flat_color = np.array([0.9, 0.4, 0.2], dtype=np.float32)  # Màu mặc định
 
@@ -50,33 +54,28 @@ class Shape2DBase:
 
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
+        gl_state.use_program(self.shader.render_idx)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
 
         # --- Wireframe Mode ---
         if self.render_mode == "Wireframe":
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_LINE)
+            gl_state.polygon_mode(GL.GL_LINE)
             GL.glLineWidth(1.0)
 
             # Dùng màu trắng rõ ràng để thấy viền
-            loc = GL.glGetUniformLocation(self.shader.render_idx, "uColor")
-            if loc != -1:
-                GL.glUniform3f(loc, 1.0, 1.0, 1.0)
+            self.uma.upload_uniform_vector3fv(WIREFRAME_COLOR, "uColor")
         else:
-            GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+            gl_state.polygon_mode(GL.GL_FILL)
             if self.render_mode == "Flat":
-                loc = GL.glGetUniformLocation(self.shader.render_idx, "uColor")
-                if loc != -1:
-                    GL.glUniform3fv(loc, 1, self.flat_color)
+                self.uma.upload_uniform_vector3fv(self.flat_color, "uColor")
 
         # --- Draw call ---
         self.vao.activate()
         GL.glDrawElements(GL.GL_TRIANGLES, len(self.indices), GL.GL_UNSIGNED_INT, None)
 
         # Reset lại polygon mode để không ảnh hưởng frame sau
-        GL.glPolygonMode(GL.GL_FRONT_AND_BACK, GL.GL_FILL)
+        gl_state.polygon_mode(GL.GL_FILL)
 
 
 
@@ -6,10 +6,13 @@ import glfw
 from OpenGL import GL
 import ctypes
 from tostudents.libs.transform import Trackball, translate, scale  
-from PIL import Image
+from tostudents.libs import gl_state
+from tostudents.libs import texture
+from tostudents.libs.bounds import Bounded
+from tostudents.libs.simplify import strip_to_triangles
 
 
-class Cube(object):
+class Cube(Bounded):
     def __init__(self, vert_shader, frag_shader):
         self.vertices = 0.5 * np.array(
             [
@@ -52,10 +55,14 @@ class Cube(object):
 
         self.vao = VAO()
 
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)
 
+    def triangles(self):
+        """ triangle list of the strip, for bounds.BVH """
+        return strip_to_triangles(self.indices).reshape(-1, 3)
+
     """
     Create object -> call setup -> call draw
     """
@@ -72,14 +79,13 @@ class Cube(object):
         return self
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
@@ -104,7 +110,7 @@ class Cube(object):
             [0, 0], [1, 0], [1, 1], [0, 1],
         ], dtype=np.float32)
 
-class Sphere(object):
+class Sphere(Bounded):
     def __init__(self, vert_shader, frag_shader, stacks=32, slices=64, texture_path=None):
         self.stacks = stacks
         self.slices = slices
@@ -157,7 +163,7 @@ class Sphere(object):
         self.colors = np.array(colors, dtype=np.float32)
 
         # ----- 4. Shader + Uniform manager + VAO -----
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.vao = VAO()
         self.texture_id = None
@@ -179,44 +185,33 @@ class Sphere(object):
     # ---------------------------------------------------------
     def draw(self, projection, view, model):
         """Vẽ sphere với shader hiện tại"""
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, "projection", True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, "model", True)
-        self.uma.upload_uniform_matrix4fv(view, "view", True)
 
         # Gắn texture nếu có
         if self.texture_id:
-            GL.glActiveTexture(GL.GL_TEXTURE0)
-            GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-            tex_loc = GL.glGetUniformLocation(self.shader.render_idx, "tex")
-            GL.glUniform1i(tex_loc, 0)
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
     # ---------------------------------------------------------
     def load_texture(self, path):
-        """Nạp texture (ví dụ earth.jpg)"""
-        img = Image.open(path).transpose(Image.FLIP_TOP_BOTTOM).convert("RGB")
-        img_data = img.tobytes("raw", "RGB", 0, -1)
-
-        self.texture_id = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGB,
-                        img.width, img.height, 0, GL.GL_RGB,
-                        GL.GL_UNSIGNED_BYTE, img_data)
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_S, GL.GL_REPEAT)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_WRAP_T, GL.GL_REPEAT)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-        print(f"[INFO] Texture loaded successfully: {path}")
+        """Nạp texture (ví dụ earth.jpg), dùng chung qua texture cache"""
+        if self.texture_id is not None:
+            texture.release(self.texture_id)
+        self.texture_id = texture.load_async(path, mode="RGB")
+
+    def __del__(self):
+        if getattr(self, "texture_id", None) is not None:
+            texture.release(self.texture_id)
 
     # ---------------------------------------------------------
     def set_color(self, rgb):
@@ -228,7 +223,7 @@ class Sphere(object):
 
 
 
-class Cone(object):
+class Cone(Bounded):
     def __init__(self, vert_shader, frag_shader, slices=48):
         self.slices = slices
         r = 0.5
@@ -294,11 +289,15 @@ class Cone(object):
 
         # ----- 4. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)
 
     # ---------------------------------------------------------
+    def triangles(self):
+        """ triangle list of the strip, for bounds.BVH """
+        return strip_to_triangles(self.indices).reshape(-1, 3)
+
     def setup(self):
         self.vao.add_vbo(0, self.vertices, ncomponents=3, stride=0, offset=None)
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
@@ -310,17 +309,16 @@ class Cone(object):
 
     # ---------------------------------------------------------
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
     def generate_uv(self):
@@ -339,7 +337,7 @@ class Cone(object):
         self.colors = np.tile(rgb, (self.vertices.shape[0], 1))
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
 
-class ConeFan(object):
+class ConeFan(Bounded):
     def __init__(self, vert_shader, frag_shader, slices=48):
         self.slices = slices
         r = 0.5
@@ -395,9 +393,15 @@ class ConeFan(object):
 
         # ----- 5. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
 
+    def triangles(self):
+        """ triangle list of the side and bottom fans, for bounds.BVH """
+        fans = [np.stack([np.full(len(f) - 2, f[0]), f[1:-1], f[2:]], axis=1)
+                for f in (self.side_indices, self.bottom_indices)]
+        return np.concatenate(fans).astype(np.int64)
+
     def setup(self):
         self.vao.add_vbo(0, self.vertices, ncomponents=3, stride=0, offset=None)
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
@@ -411,17 +415,16 @@ class ConeFan(object):
         return self
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
 
         # Vẽ mặt bên
         GL.glBindBuffer(GL.GL_ELEMENT_ARRAY_BUFFER, self.vao.ebo)
@@ -442,7 +445,7 @@ class ConeFan(object):
         self.colors = np.tile(rgb, (self.vertices.shape[0], 1))
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
 
-class Cylinder(object):
+class Cylinder(Bounded):
     def __init__(self, vert_shader, frag_shader, n=32):
         self.n = n
         r = 0.5
@@ -509,11 +512,15 @@ class Cylinder(object):
 
         # ----- 4. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)
 
     # ---------------------------------------------------------
+    def triangles(self):
+        """ triangle list of the strip, for bounds.BVH """
+        return strip_to_triangles(self.indices).reshape(-1, 3)
+
     def setup(self):
         self.vao.add_vbo(0, self.vertices, ncomponents=3, stride=0, offset=None)
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
@@ -526,21 +533,19 @@ class Cylinder(object):
 
     # ---------------------------------------------------------
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         if self.texture_id:
-            GL.glActiveTexture(GL.GL_TEXTURE0)
-            GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-            self.uma.upload_uniform_1i(0, "tex")
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         GL.glDrawElements(GL.GL_TRIANGLE_STRIP, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
@@ -595,7 +600,7 @@ class ConeWithCylinder(object):
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
 '''
 
-class Tetrahedron(object):
+class Tetrahedron(Bounded):
     def __init__(self, vert_shader, frag_shader, size=1.0):
         """
         Tứ diện đều (Regular Tetrahedron)
@@ -649,7 +654,7 @@ class Tetrahedron(object):
         
         # Shader & VAO
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)
 
@@ -700,21 +705,19 @@ class Tetrahedron(object):
         return self
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         if self.texture_id:
-            GL.glActiveTexture(GL.GL_TEXTURE0)
-            GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-            self.uma.upload_uniform_1i(0, "tex")
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
@@ -732,7 +735,7 @@ class Tetrahedron(object):
         ], dtype=np.float32)
 
 
-class Cylinder2(object):
+class Cylinder2(Bounded):
     def __init__(self, vert_shader, frag_shader, n=32, r_bottom=0.3, r_top=0.1):
         """
         Truncated Cone (Hình nón cụt)
@@ -810,7 +813,7 @@ class Cylinder2(object):
 
         # ----- 4. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
         self.transform = np.eye(4)  # Thêm transform matrix
 
@@ -826,17 +829,21 @@ class Cylinder2(object):
 
     # ---------------------------------------------------------
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
+
+        # Gắn texture nếu có
+        if self.texture_id:
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
     def set_color(self, rgb):
         """Cập nhật màu Flat từ Viewer"""
@@ -856,19 +863,17 @@ class Cylinder2(object):
         self.texcoords = np.array(uv, dtype=np.float32)
 
     def load_texture(self, path):
-        """Load ảnh ngoài vào OpenGL texture"""
-        img = Image.open(path).transpose(Image.FLIP_TOP_BOTTOM).convert("RGBA")
-        img_data = np.array(img, dtype=np.uint8)
-        self.texture_id = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, img.width, img.height, 0,
-                        GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, img_data)
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
-
-
-class Torus(object):
+        """Load ảnh ngoài vào OpenGL texture (dùng chung qua texture cache)"""
+        if self.texture_id is not None:
+            texture.release(self.texture_id)
+        self.texture_id = texture.load_async(path, mode="RGBA")
+
+    def __del__(self):
+        if getattr(self, "texture_id", None) is not None:
+            texture.release(self.texture_id)
+
+
+class Torus(Bounded):
     def __init__(self, vert_shader, frag_shader, major_segments=32, minor_segments=16, major_radius=0.4, minor_radius=0.15):
         """
         Torus (Hình xuyến - hình bánh donut)
@@ -940,7 +945,7 @@ class Torus(object):
 
         # ----- 4. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
     def set_color(self, rgb):
         """Cập nhật màu Flat từ Viewer"""
@@ -959,17 +964,21 @@ class Torus(object):
         return self
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
+
+        # Gắn texture nếu có
+        if self.texture_id:
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
 
     def set_color(self, rgb):
@@ -987,20 +996,18 @@ class Torus(object):
                 uv.append([u, v])
         self.texcoords = np.array(uv, dtype=np.float32)
     def load_texture(self, path):
-        """Load ảnh ngoài vào OpenGL texture"""
-        img = Image.open(path).transpose(Image.FLIP_TOP_BOTTOM).convert("RGBA")
-        img_data = np.array(img, dtype=np.uint8)
-        self.texture_id = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, img.width, img.height, 0,
-                        GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, img_data)
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        """Load ảnh ngoài vào OpenGL texture (dùng chung qua texture cache)"""
+        if self.texture_id is not None:
+            texture.release(self.texture_id)
+        self.texture_id = texture.load_async(path, mode="RGBA")
 
+    def __del__(self):
+        if getattr(self, "texture_id", None) is not None:
+            texture.release(self.texture_id)
 
 
-class Prism(object):
+
+class Prism(Bounded):
     def __init__(self, vert_shader, frag_shader, n_sides=6, height=0.8, radius=0.4):
         """
         Prism (Lăng trụ đều)
@@ -1084,7 +1091,7 @@ class Prism(object):
 
         # ----- 4. Shader + VAO -----
         self.vao = VAO()
-        self.shader = Shader(vert_shader, frag_shader)
+        self.shader = shader_variant(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
 
     def setup(self):
@@ -1102,17 +1109,21 @@ class Prism(object):
         self.vao.add_vbo(1, self.colors, ncomponents=3, stride=0, offset=None)
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
 
         if model is None:
             model = np.eye(4, dtype=np.float32)
 
-        self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
+        self.uma.upload_camera(projection, view)
         self.uma.upload_uniform_matrix4fv(model, 'model', True)
-        self.uma.upload_uniform_matrix4fv(view, 'view', True)
+
+        # Gắn texture nếu có
+        if self.texture_id:
+            gl_state.bind_texture(self.texture_id, 0)
+            self.uma.upload_uniform_scalar1i(0, "tex")
 
         self.vao.activate()
-        GL.glEnable(GL.GL_DEPTH_TEST)
+        gl_state.enable(GL.GL_DEPTH_TEST)
         GL.glDrawElements(GL.GL_TRIANGLES, self.indices.shape[0], GL.GL_UNSIGNED_INT, None)
     def set_color(self, rgb):
         """Cập nhật màu Flat từ Viewer"""
@@ -1133,15 +1144,13 @@ class Prism(object):
         self.texcoords = np.array(uv, dtype=np.float32)
 
     def load_texture(self, path):
-        """Load ảnh ngoài vào OpenGL texture"""
-        img = Image.open(path).transpose(Image.FLIP_TOP_BOTTOM).convert("RGBA")
-        img_data = np.array(img, dtype=np.uint8)
-        self.texture_id = GL.glGenTextures(1)
-        GL.glBindTexture(GL.GL_TEXTURE_2D, self.texture_id)
-        GL.glTexImage2D(GL.GL_TEXTURE_2D, 0, GL.GL_RGBA, img.width, img.height, 0,
-                        GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, img_data)
-        GL.glGenerateMipmap(GL.GL_TEXTURE_2D)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MIN_FILTER, GL.GL_LINEAR_MIPMAP_LINEAR)
-        GL.glTexParameteri(GL.GL_TEXTURE_2D, GL.GL_TEXTURE_MAG_FILTER, GL.GL_LINEAR)
+        """Load ảnh ngoài vào OpenGL texture (dùng chung qua texture cache)"""
+        if self.texture_id is not None:
+            texture.release(self.texture_id)
+        self.texture_id = texture.load_async(path, mode="RGBA")
+
+    def __del__(self):
+        if getattr(self, "texture_id", None) is not None:
+            texture.release(self.texture_id)
 
 
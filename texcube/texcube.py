@@ -1,10 +1,12 @@
-from kstn2021.libs.shader import *
-from kstn2021.libs import transform as T
-from kstn2021.libs.buffer import *
+from tostudents.libs.shader import *
+from tostudents.libs import transform as T
+from tostudents.libs.buffer import *
 import ctypes
 import glfw
 import OpenGL.GL as GL
 import numpy as np
+from tostudents.libs import gl_state
+from tostudents.object3d.textured.prepare import load_atlas, remap_uv
 
 
 """
@@ -60,7 +62,9 @@ Texture (2D image: 3x4, see: shape/texcube/image/texture.jpeg
 
 
 class TexCube(object):
-    def __init__(self, vert_shader, frag_shader):
+    def __init__(self, vert_shader, frag_shader, atlas=None, atlas_name="texture"):
+        """ atlas: metadata file from prepare.build_atlas, the cube then samples
+                   the atlas_name rect of that atlas instead of ./image/texture.jpeg """
         self.vertices = np.array(
             [
                 # YOUR CODE HERE to specify vertices' coordinates
@@ -95,12 +99,18 @@ class TexCube(object):
 
         self.shader = Shader(vert_shader, frag_shader)
         self.uma = UManager(self.shader)
-        #
+        self.atlas = load_atlas(atlas) if atlas else None     # (image, {name: uv rect})
+        self.atlas_name = atlas_name
 
     """
     Create object -> call setup -> call draw
     """
     def setup(self):
+        texture_file = "./image/texture.jpeg"
+        if self.atlas:
+            texture_file = self.atlas[0]
+            self.texcoords = remap_uv(self.texcoords, self.atlas[1][self.atlas_name])
+
         # setup VAO for drawing cylinder's side
         self.vao.add_vbo(0, self.vertices, ncomponents=3, stride=0, offset=None)
         self.vao.add_vbo(1, self.normals, ncomponents=3, stride=0, offset=None)
@@ -111,7 +121,7 @@ class TexCube(object):
         self.vao.add_ebo(self.indices)
 
         # setup textures
-        self.uma.setup_texture("texture", "./image/texture.jpeg")
+        self.uma.setup_texture("texture", texture_file)
 
         # Light
         I_light = np.array([
@@ -139,7 +149,7 @@ class TexCube(object):
         return self
 
     def draw(self, projection, view, model):
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         modelview = view
 
         self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
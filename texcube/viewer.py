@@ -4,6 +4,8 @@ import numpy as np                  # all matrix manipulations & OpenGL args
 from itertools import cycle   # cyclic iterator to easily toggle polygon rendering modes
 from tostudents.libs.transform import Trackball
 from texcube import *
+from tostudents.libs import gl_state
+from tostudents.libs import texture
 # ------------  Viewer class & windows management ------------------------------
 class Viewer:
     """ GLFW viewer windows, with classic initialization & graphics loop """
@@ -42,7 +44,7 @@ class Viewer:
         #GL.glEnable(GL.GL_CULL_FACE)   # enable backface culling (Exercise 1)
         #GL.glFrontFace(GL.GL_CCW) # GL_CCW: default
 
-        GL.glEnable(GL.GL_DEPTH_TEST)  # enable depth test (Exercise 1)
+        gl_state.enable(GL.GL_DEPTH_TEST)  # enable depth test (Exercise 1)
         GL.glDepthFunc(GL.GL_LESS)   # GL_LESS: default
 
 
@@ -52,6 +54,9 @@ class Viewer:
     def run(self):
         """ Main render loop for this OpenGL windows """
         while not glfw.window_should_close(self.win):
+            # upload textures decoded in the background (per-frame budget)
+            texture.process_uploads()
+
             # clear draw buffer
             GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
 
@@ -80,7 +85,7 @@ class Viewer:
                 glfw.set_window_should_close(self.win, True)
 
             if key == glfw.KEY_W:
-                GL.glPolygonMode(GL.GL_FRONT_AND_BACK, next(self.fill_modes))
+                gl_state.polygon_mode(next(self.fill_modes))
 
             for drawable in self.drawables:
                 if hasattr(drawable, 'key_handler'):
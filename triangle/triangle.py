@@ -5,6 +5,7 @@ from tostudents.libs.shader import *
 from tostudents.libs import transform as T
 from tostudents.libs.buffer import *
 import ctypes
+from tostudents.libs import gl_state
 
 class Triangle:
     def __init__(self, vert_shader, frag_shader):
@@ -40,7 +41,7 @@ class Triangle:
         self.vao.add_vbo(1, self.colors, ncomponents=3, dtype=GL.GL_FLOAT, normalized=False, stride=0, offset=None)
         self.vao.add_vbo(2, self.normals, ncomponents=3, dtype=GL.GL_FLOAT, normalized=False, stride=0, offset=None)
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         projection = T.ortho(-1, 1, -1, 1, -1, 1)
         modelview = np.identity(4, 'f')
         self.uma.upload_uniform_matrix4fv(projection, 'projection', True)
@@ -75,7 +76,7 @@ class Triangle:
 
     def draw(self, projection, view, model):
         self.vao.activate()
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         GL.glDrawArrays(GL.GL_TRIANGLES, 0, 3)
         self.vao.deactivate()
 
@@ -115,7 +116,7 @@ class TriangleEx:
         self.vao.add_vbo(1, self.vertex_attrib, ncomponents=3, dtype=GL.GL_FLOAT, normalized=False, stride=stride, offset=offset_c)
         self.vao.add_vbo(2, self.vertex_attrib, ncomponents=3, dtype=GL.GL_FLOAT, normalized=False, stride=stride, offset=offset_n)
 
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         normalMat = np.identity(4, 'f')
         projection = T.ortho(-1, 1, -1, 1, -1, 1)
         modelview = np.identity(4, 'f')
@@ -152,6 +153,6 @@ class TriangleEx:
 
     def draw(self, projection, view, model):
         self.vao.activate()
-        GL.glUseProgram(self.shader.render_idx)
+        gl_state.use_program(self.shader.render_idx)
         GL.glDrawArrays(GL.GL_TRIANGLES, 0, 3)
         self.vao.deactivate()
\ No newline at end of file